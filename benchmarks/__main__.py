@@ -0,0 +1,40 @@
+import argparse
+import json
+import pathlib
+import re
+import sys
+
+from benchmarks.cases import all_benchmarks
+from benchmarks.runner import DEFAULT_MIN_TIME, DEFAULT_REPEAT, DEFAULT_TOLERANCE, compare, load_results, run, \
+    save_results
+
+
+BASELINE_PATH = pathlib.Path(__file__).parent / 'baseline.json'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the hot paths of the engine and the GUI, print the results '
+                                                 'as JSON and compare them with the baseline.')
+    parser.add_argument('--filter', default='', help='regular expression the names of the benchmarks should match')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument('--output', type=pathlib.Path, help='file to write the results into')
+    parser.add_argument('--baseline', type=pathlib.Path, default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative slowdown reported as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args()
+
+    benchmarks = [benchmark for benchmark in all_benchmarks() if re.search(args.filter, benchmark.name)]
+    results = run(benchmarks, args.repeat, args.min_time,
+                  report=lambda name, result: print(json.dumps({'benchmark': name, **result}), file=sys.stderr))
+    baseline = load_results(args.baseline)
+    results['regressions'] = [] if baseline is None else compare(results, baseline, args.tolerance)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        save_results(args.output, results)
+    if args.save_baseline:  # benchmarks left out by the filter keep their baseline
+        kept = {} if baseline is None else baseline['benchmarks']
+        save_results(args.baseline, {'meta': results['meta'], 'benchmarks': {**kept, **results['benchmarks']}})
+    elif results['regressions']:
+        sys.exit(1)
@@ -0,0 +1,150 @@
+import importlib.util
+import itertools
+import pathlib
+import random
+import subprocess
+import sys
+from collections import deque
+
+from benchmarks.runner import Benchmark
+from utils.ai import Mind, batch_lookup_tables, lookup_tables
+from utils.board_cache import BOARD_CACHE
+from utils.cards import CARDS, N_CARDS, Deck
+from utils.game import Round
+from utils.player import Player
+from utils.policies import behavior_policies
+from utils.preflop import load_preflop_table
+
+
+EVALUATED_HANDS = 1_000  # hands evaluated by a single operation
+HAND_SIZES = (5, 6, 7)
+ROUND_PLAYERS = (2, 6, 14)
+MAX_ACTIONS_PER_ROUND = 1_000
+SEED = 0
+ROOT = pathlib.Path(__file__).parent.parent
+HEADLESS_MODULES = ('utils.game', 'utils.simulate')  # the engine and the simulator
+APP_MODULE = 'utils.gui.gui_workers'
+GUI_DEPENDENCIES = ('pandas', 'PIL', 'streamlit')
+
+
+def clear_engine_caches():
+    """Drop the evaluator tables, the preflop table and the board cache of the process."""
+    lookup_tables.cache_clear()
+    batch_lookup_tables.cache_clear()
+    load_preflop_table.cache_clear()
+    BOARD_CACHE.clear()
+
+
+def _hand_strength(n_cards: int) -> Benchmark:
+    def make():
+        rng = random.Random(SEED)
+        hands = itertools.cycle([Mind(rng.sample(CARDS, n_cards)) for _ in range(EVALUATED_HANDS * 10)])
+
+        def evaluate():
+            for _ in range(EVALUATED_HANDS):
+                next(hands).evaluate_hand_strength()
+        return evaluate
+    return Benchmark(f'evaluate_hand_strength_{n_cards}_cards', 'hand', make, EVALUATED_HANDS, clear_engine_caches)
+
+
+def _deck_construction() -> Benchmark:
+    return Benchmark('deck_construction', 'deck', lambda: Deck)
+
+
+def _deck_deal() -> Benchmark:
+    def make():
+        deck = Deck(random.Random(SEED))
+
+        def deal():
+            deck.shuffle()
+            for _ in range(N_CARDS // 2):
+                deck.deal(2)
+        return deal
+    return Benchmark('deck_deal', 'pair of cards', make, N_CARDS // 2)
+
+
+def _round_playthrough(n_players: int) -> Benchmark:
+    def make():
+        policies = behavior_policies(SEED)
+        seeds = itertools.count(SEED)
+
+        def play():
+            players = deque(Player(f'Player {i}', behavior, policy=policies[behavior])
+                            for i, behavior in zip(range(n_players), itertools.cycle(policies)))
+            game_round = Round(players, seed=next(seeds))
+            while not game_round.is_finished:
+                if game_round.n_actions > MAX_ACTIONS_PER_ROUND:
+                    raise RuntimeError('The round does not end.')
+                game_round.next_event()
+        return play
+    return Benchmark(f'round_{n_players}_players', 'round', make, 1, clear_engine_caches)
+
+
+def _image_benchmarks() -> list[Benchmark]:
+    """Composition of the card images with the memoization of the composed images bypassed, so that
+    only the decoded cards are warm. Left out when Pillow or the card images are missing, the paths
+    are relative to the root of the repository like in the app.
+    """
+    try:
+        from utils.gui import image_workers
+    except ImportError:
+        return []
+    if not image_workers.BACK_PLAYING_CARD.exists():
+        return []
+
+    def clear():
+        for cached in (image_workers.load_sprites, image_workers.card_image_size, image_workers.load_card_image,
+                       image_workers.draw_table_cards, image_workers.draw_your_cards):
+            cached.cache_clear()
+
+    def make_table_cards():
+        rng = random.Random(SEED)
+
+        def draw():
+            cards = rng.sample(CARDS, 5)
+            image_workers.draw_table_cards.__wrapped__(tuple(image_workers.card_image_path(card) for card in cards))
+        return draw
+
+    def make_your_cards():
+        rng = random.Random(SEED)
+
+        def draw():
+            image_workers.draw_your_cards.__wrapped__(tuple(rng.sample(CARDS, 2)))
+        return draw
+
+    return [Benchmark('draw_table_cards', 'image', make_table_cards, 1, clear),
+            Benchmark('draw_your_cards', 'image', make_your_cards, 1, clear)]
+
+
+def _import_time(module: str, forbidden: tuple[str, ...] = ()) -> Benchmark:
+    """Cold start: a new interpreter importing the module, which fails if it pulls in any of the forbidden
+    modules. The start of the interpreter itself is included.
+    """
+    check = f'import sys, {module}; assert not {{{", ".join(map(repr, forbidden))}}} & set(sys.modules)' \
+        if forbidden else f'import {module}'
+
+    def make():
+        def start():
+            result = subprocess.run([sys.executable, '-c', check], cwd=ROOT, capture_output=True, text=True)
+            if result.returncode:
+                raise RuntimeError(f'Importing {module} failed:\n{result.stderr}')
+        return start
+    return Benchmark(f'import_{module.replace(".", "_")}', 'process', make)
+
+
+def _import_benchmarks() -> list[Benchmark]:
+    """Cold starts of the headless modules, which must not import the GUI dependencies, and of the app
+    when Streamlit is installed.
+    """
+    benchmarks = [_import_time(module, GUI_DEPENDENCIES) for module in HEADLESS_MODULES]
+    if importlib.util.find_spec('streamlit') is not None:
+        benchmarks.append(_import_time(APP_MODULE))
+    return benchmarks
+
+
+def all_benchmarks() -> list[Benchmark]:
+    return ([_hand_strength(n_cards) for n_cards in HAND_SIZES]
+            + [_deck_construction(), _deck_deal()]
+            + [_round_playthrough(n_players) for n_players in ROUND_PLAYERS]
+            + _image_benchmarks()
+            + _import_benchmarks())
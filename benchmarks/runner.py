@@ -0,0 +1,115 @@
+import json
+import pathlib
+import platform
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+
+DEFAULT_REPEAT = 5
+DEFAULT_MIN_TIME = 0.2  # seconds every warm repetition runs for at least
+DEFAULT_TOLERANCE = 0.25  # relative slowdown from the baseline reported as a regression
+METRICS = ('cold_seconds', 'warm_seconds')  # seconds per operation, lower is better
+
+Operation = Callable[[], object]
+
+
+@dataclass
+class Benchmark:
+    """A hot path measured twice: right after its caches have been dropped and once they are warm.
+
+    Attributes
+    ----------
+    name : str
+        Key of the benchmark in the results.
+    unit : str
+        What one operation is, e.g. 'hand' or 'round'.
+    make : Callable[[], Operation]
+        Prepares the inputs and returns the operation to time; every call of the operation
+        should do new work, e.g. evaluate other cards, so that only the intended caches are warm.
+    ops : int
+        Number of units a single call of the operation handles.
+    clear : Callable[[], None]
+        Drops every cache the operation relies on, the lookup tables, decoded images and the like.
+    """
+    name: str
+    unit: str
+    make: Callable[[], Operation]
+    ops: int = 1
+    clear: Callable[[], None] = lambda: None
+
+
+def measure(benchmark: Benchmark, repeat: int = DEFAULT_REPEAT, min_time: float = DEFAULT_MIN_TIME) -> dict:
+    """Seconds per unit of the first call after clearing the caches (the median of `repeat` cold starts)
+    and of the calls once the caches are warm (the best of `repeat` runs of at least `min_time`).
+    """
+    cold = []
+    for _ in range(repeat):
+        benchmark.clear()
+        operation = benchmark.make()
+        start = time.perf_counter()
+        operation()
+        cold.append((time.perf_counter() - start) / benchmark.ops)
+
+    operation = benchmark.make()
+    operation()
+    warm = []
+    for _ in range(repeat):
+        calls, start = 0, time.perf_counter()
+        while True:
+            operation()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        warm.append(elapsed / (calls * benchmark.ops))
+    return {'unit': benchmark.unit,
+            'cold_seconds': statistics.median(cold),
+            'warm_seconds': min(warm),
+            'per_second': 1 / min(warm)}
+
+
+def run(benchmarks: list[Benchmark], repeat: int = DEFAULT_REPEAT, min_time: float = DEFAULT_MIN_TIME,
+        report: Optional[Callable[[str, dict], None]] = None) -> dict:
+    """Measure the benchmarks one after another, `report` is called with every result as it comes."""
+    results = {}
+    for benchmark in benchmarks:
+        results[benchmark.name] = measure(benchmark, repeat, min_time)
+        if report is not None:
+            report(benchmark.name, results[benchmark.name])
+    return {'meta': {'python': platform.python_version(),
+                     'numpy': np.__version__,
+                     'machine': platform.machine(),
+                     'processor': platform.processor()},
+            'benchmarks': results}
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[dict]:
+    """Metrics which got slower than the baseline by more than the tolerance.
+    Benchmarks missing from either side are not compared.
+    """
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        expected = baseline['benchmarks'].get(name)
+        if expected is None:
+            continue
+        for metric in METRICS:
+            ratio = result[metric] / expected[metric]
+            if ratio > 1 + tolerance:
+                regressions.append({'benchmark': name, 'metric': metric, 'baseline': expected[metric],
+                                    'current': result[metric], 'ratio': ratio})
+    return regressions
+
+
+def load_results(path: pathlib.Path) -> Optional[dict]:
+    """Results saved by `save_results`, None if there are none."""
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_results(path: pathlib.Path, results: dict):
+    path.write_text(json.dumps(results, indent=2) + '\n')
@@ -34,4 +34,7 @@ with st.sidebar:
 
         new_game_button = st.form_submit_button("Start a new game", on_click=gui_workers.create_game_layout)
 
-gui_workers.manipulate_css()
\ No newline at end of file
+gui_workers.manipulate_css()
+
+with st.sidebar:
+    gui_workers.display_instrumentation()
\ No newline at end of file
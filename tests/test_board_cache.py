@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+import uuid
+
+import numpy as np
+
+from utils.board_cache import BoardCache, SharedBoardTable, board_key
+from utils.cards import CARDS
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOARD = CARDS[:3]
+
+
+def test_values_do_not_depend_on_the_order_of_the_board():
+    cache = BoardCache()
+    np.testing.assert_array_equal(cache.values(BOARD), cache.values(BOARD[::-1]))
+    assert cache.info().hits == 1 and cache.info().misses == 1
+
+
+def test_shared_table_outlives_a_consumer_run():
+    cache = BoardCache()
+    cache.values(BOARD)
+    table = cache.share(f'poker_boards_{uuid.uuid4().hex[:8]}')
+    try:
+        result = subprocess.run([sys.executable, '-m', 'utils.simulate', '--hands', '20', '--chunk-size', '10',
+                                 '--workers', '2', '--board-cache', '--shared-boards', table.name],
+                                cwd=ROOT, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert 'leaked shared_memory' not in result.stderr
+        reader = SharedBoardTable.attach(table.name)  # the block is still there after the consumers are gone
+        np.testing.assert_array_equal(reader.get(board_key(BOARD)), cache.values(BOARD))
+        reader.close()
+    finally:
+        table.close()
+        table.unlink()
+
+
+def test_values_many_matches_the_boards_one_by_one():
+    boards = np.array([[0, 1, 2, 3, 4], [2, 3, 4, 5, 6], [0, 2, 4, 5, 6]])
+    cache = BoardCache()
+    cache.values(boards[0])
+    np.testing.assert_array_equal(cache.values_many(boards), np.stack([BoardCache().values(b) for b in boards]))
+    assert cache.info().hits == 1 and cache.info().misses == 3
@@ -1,8 +1,11 @@
-from collections import Counter
 from enum import IntEnum
-from itertools import combinations
+from functools import lru_cache
+from itertools import combinations_with_replacement
+from typing import NamedTuple, Sequence
 
-from utils.cards import PlayingCard
+import numpy as np
+
+from utils.cards import PlayingCard, RANKS, SUITS, N_CARDS
 
 
 class PokerHand(IntEnum):
@@ -19,12 +22,316 @@ class PokerHand(IntEnum):
     ROYAL_FLUSH = 10
 
 
-CARD_RANKS_TO_INT_ACE_FIRST = {'ace': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10,
-                               'jack': 11, 'queen': 12, 'king': 13}
-CARD_RANKS_TO_INT_ACE_LAST = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10,
-                              'jack': 11, 'queen': 12, 'king': 13, 'ace': 14}
-ROYAL_FLUSH_RANKS = [10, 11, 12, 13, 14]
 MAX_CARDS_IN_HAND = 5
+MAX_CARDS_TO_EVALUATE = 7
+N_RANKS = len(RANKS)
+ACE = N_RANKS - 1
+
+# A hand value packs the category into the upper bits and up to five tie-breaking
+# ranks (most significant first) into 4-bit slots below it, so that plain integer
+# comparison orders any two hands.
+RANK_BITS = 4
+CATEGORY_SHIFT = MAX_CARDS_IN_HAND * RANK_BITS
+
+# Per-card summands of the lookup keys. Rank counts never exceed 4, so a sum of powers of 5
+# is a unique key of the rank multiset. Suit counts never exceed 7, so 3 bits per suit suffice.
+RANK_KEYS = tuple(5 ** (card >> 2) for card in range(N_CARDS))
+SUIT_KEYS = tuple(1 << 3 * (card & 3) for card in range(N_CARDS))
+SMALL_BATCH_SIZE = 16
+
+
+def pack_hand_value(category: PokerHand, ranks: Sequence[int]) -> int:
+    """Pack a hand category and its tie-breaking ranks into a single comparable integer."""
+    value = int(category)
+    for i in range(MAX_CARDS_IN_HAND):
+        value = value << RANK_BITS | (ranks[i] if i < len(ranks) else 0)
+    return value
+
+
+def hand_category(value: int) -> PokerHand:
+    """Extract the category of a hand from its packed value."""
+    return PokerHand(value >> CATEGORY_SHIFT)
+
+
+def _straight_high(rank_mask: int) -> int:
+    """The highest rank of a straight within a 13-bit rank mask or -1 if there is none."""
+    for high in range(ACE, MAX_CARDS_IN_HAND - 3, -1):
+        if high >= MAX_CARDS_IN_HAND - 1:
+            straight_mask = 0b11111 << (high - MAX_CARDS_IN_HAND + 1)
+        else:  # the wheel: ace plays low below the five
+            straight_mask = 1 << ACE | 0b1111
+        if rank_mask & straight_mask == straight_mask:
+            return high
+    return -1
+
+
+def _flush_value(rank_mask: int, straight_high: int) -> int:
+    """Value of a hand whose cards of a single suit form a given rank mask."""
+    if straight_high == ACE:
+        return pack_hand_value(PokerHand.ROYAL_FLUSH, [ACE])
+    if straight_high >= 0:
+        return pack_hand_value(PokerHand.STRAIGHT_FLUSH, [straight_high])
+    ranks = [r for r in range(ACE, -1, -1) if rank_mask >> r & 1]
+    return pack_hand_value(PokerHand.FLUSH, ranks[:MAX_CARDS_IN_HAND])
+
+
+def _rank_multiset_value(counts: Sequence[int], straight_high: int) -> int:
+    """Value of the best hand which can be made of the given rank counts, ignoring flushes."""
+    present = [r for r in range(ACE, -1, -1) if counts[r]]
+    quads = [r for r in present if counts[r] == 4]
+    trips = [r for r in present if counts[r] == 3]
+    pairs = [r for r in present if counts[r] == 2]
+    if quads:
+        kickers = [r for r in present if r != quads[0]]
+        return pack_hand_value(PokerHand.FOUR_OF_A_KIND, quads[:1] + kickers[:1])
+    if trips and len(trips) + len(pairs) > 1:
+        return pack_hand_value(PokerHand.FULL_HOUSE, [trips[0], max(trips[1:] + pairs)])
+    if straight_high >= 0:
+        return pack_hand_value(PokerHand.STRAIGHT, [straight_high])
+    if trips:
+        kickers = [r for r in present if r != trips[0]]
+        return pack_hand_value(PokerHand.THREE_OF_A_KIND, trips[:1] + kickers[:2])
+    if len(pairs) > 1:
+        kickers = [r for r in present if r not in pairs[:2]]
+        return pack_hand_value(PokerHand.TWO_PAIR, pairs[:2] + kickers[:1])
+    if pairs:
+        kickers = [r for r in present if r != pairs[0]]
+        return pack_hand_value(PokerHand.ONE_PAIR, pairs[:1] + kickers[:3])
+    return pack_hand_value(PokerHand.HIGH_CARD, present[:MAX_CARDS_IN_HAND])
+
+
+class LookupTables(NamedTuple):
+    """Precomputed tables behind the hand evaluator.
+
+    Attributes
+    ----------
+    straight_highs : list[int]
+        Highest straight rank for every 13-bit rank mask, -1 if there is no straight.
+    flush_suits : list[int]
+        Suit having at least five cards for every sum of SUIT_KEYS, -1 if there is no flush.
+    flush_values : list[int]
+        Hand value for every 13-bit rank mask of cards of the flush suit.
+    rank_values : dict[int, int]
+        Hand value for every sum of RANK_KEYS of 1 to 7 cards, assuming no flush.
+    """
+    straight_highs: list[int]
+    flush_suits: list[int]
+    flush_values: list[int]
+    rank_values: dict[int, int]
+
+
+@lru_cache(maxsize=None)
+def lookup_tables() -> LookupTables:
+    """Build the evaluator tables once per process."""
+    n_masks = 1 << N_RANKS
+    straight_highs = [_straight_high(mask) for mask in range(n_masks)]
+    flush_values = [_flush_value(mask, straight_highs[mask]) if mask.bit_count() >= MAX_CARDS_IN_HAND else 0
+                    for mask in range(n_masks)]
+
+    flush_suits = []
+    for suit_key in range(1 << 3 * len(SUITS)):
+        suit_counts = [suit_key >> 3 * suit & 0b111 for suit in range(len(SUITS))]
+        flush_suits.append(next((suit for suit, count in enumerate(suit_counts) if count >= MAX_CARDS_IN_HAND), -1))
+
+    rank_values = {}
+    for n_cards in range(1, MAX_CARDS_TO_EVALUATE + 1):
+        for ranks in combinations_with_replacement(range(N_RANKS), n_cards):
+            counts = [0] * N_RANKS
+            for r in ranks:
+                counts[r] += 1
+            if max(counts) > len(SUITS):
+                continue
+            rank_key = sum(5 ** r for r in ranks)
+            rank_mask = sum(1 << r for r in set(ranks))
+            rank_values[rank_key] = _rank_multiset_value(counts, straight_highs[rank_mask])
+    return LookupTables(straight_highs, flush_suits, flush_values, rank_values)
+
+
+def evaluate_cards(cards: Sequence[int]) -> int:
+    """Value of the best five-card hand within 1 to 7 integer-encoded cards.
+    A greater value means a stronger hand, equal values mean a tie.
+    """
+    tables = lookup_tables()
+    rank_key = suit_key = 0
+    for card in cards:
+        rank_key += RANK_KEYS[card]
+        suit_key += SUIT_KEYS[card]
+    flush_suit = tables.flush_suits[suit_key]
+    if flush_suit < 0:
+        return tables.rank_values[rank_key]
+    suit_mask = 0
+    for card in cards:
+        if card & 3 == flush_suit:
+            suit_mask |= 1 << (card >> 2)
+    return tables.flush_values[suit_mask]
+
+
+class HandState:
+    """Running summary of the cards of a hand which is updated as the cards arrive,
+    so that evaluating the hand at any moment takes a couple of table reads.
+
+    Attributes
+    ----------
+    rank_key : int
+        Sum of RANK_KEYS of the cards, its base-5 digits are the counts of every rank.
+    suit_key : int
+        Sum of SUIT_KEYS of the cards, its 3-bit digits are the counts of every suit.
+    rank_mask : int
+        Bitmask of the present ranks, used for straights.
+    suit_masks : list[int]
+        Bitmask of the present ranks of every suit, used for flushes.
+    """
+    __slots__ = ('rank_key', 'suit_key', 'rank_mask', 'suit_masks', '_value')
+
+    def __init__(self, cards: Sequence[int] = ()):
+        self.clear()
+        self.add(cards)
+
+    def clear(self):
+        self.rank_key = self.suit_key = self.rank_mask = 0
+        self.suit_masks = [0] * len(SUITS)
+        self._value = None
+
+    def add(self, cards: Sequence[int]):
+        """Take new integer-encoded cards into account."""
+        for card in cards:
+            self.rank_key += RANK_KEYS[card]
+            self.suit_key += SUIT_KEYS[card]
+            self.rank_mask |= 1 << (card >> 2)
+            self.suit_masks[card & 3] |= 1 << (card >> 2)
+        self._value = None
+
+    def rank_count(self, rank: int) -> int:
+        return self.rank_key // RANK_KEYS[rank << 2] % 5
+
+    def suit_count(self, suit: int) -> int:
+        return self.suit_key >> 3 * suit & 0b111
+
+    @property
+    def n_cards(self) -> int:
+        return sum(self.suit_count(suit) for suit in range(len(SUITS)))
+
+    def straight_high(self) -> int:
+        """The highest rank of a straight among the cards or -1 if there is none."""
+        return lookup_tables().straight_highs[self.rank_mask]
+
+    def value(self) -> int:
+        """Same value as `evaluate_cards` gives for the cards added so far."""
+        if self._value is None:
+            if not self.suit_key:
+                raise ValueError('There are no cards to evaluate.')
+            tables = lookup_tables()
+            flush_suit = tables.flush_suits[self.suit_key]
+            if flush_suit < 0:
+                self._value = tables.rank_values[self.rank_key]
+            else:
+                self._value = tables.flush_values[self.suit_masks[flush_suit]]
+        return self._value
+
+    def category(self) -> PokerHand:
+        return hand_category(self.value())
+
+
+class BatchLookupTables(NamedTuple):
+    """NumPy versions of the evaluator tables used by the batch evaluator.
+
+    Attributes
+    ----------
+    straight_highs : np.ndarray
+        Same as LookupTables.straight_highs.
+    flush_values : np.ndarray
+        Same as LookupTables.flush_values.
+    top_ranks : np.ndarray
+        Array of shape (MAX_CARDS_IN_HAND + 1, 2 ** 13) where row k holds the k highest ranks
+        of every rank mask packed into 4-bit slots, most significant first.
+    """
+    straight_highs: np.ndarray
+    flush_values: np.ndarray
+    top_ranks: np.ndarray
+
+
+@lru_cache(maxsize=None)
+def batch_lookup_tables() -> BatchLookupTables:
+    """Build the NumPy evaluator tables once per process."""
+    tables = lookup_tables()
+    top_ranks = np.zeros((MAX_CARDS_IN_HAND + 1, 1 << N_RANKS), dtype=np.int64)
+    for mask in range(1 << N_RANKS):
+        ranks = [r for r in range(ACE, -1, -1) if mask >> r & 1]
+        for k in range(1, MAX_CARDS_IN_HAND + 1):
+            for i in range(k):
+                top_ranks[k, mask] = top_ranks[k, mask] << RANK_BITS | (ranks[i] if i < len(ranks) else 0)
+    return BatchLookupTables(np.array(tables.straight_highs, dtype=np.int64),
+                             np.array(tables.flush_values, dtype=np.int64),
+                             top_ranks)
+
+
+def evaluate_batch(cards: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Evaluate many hands at once.
+
+    Parameters
+    ----------
+    cards : np.ndarray
+        Integer array of shape (N, k) with 1 <= k <= 7 integer-encoded cards per row.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Array of shape (N,) with the same values as `evaluate_cards` would give for every row,
+        and an array of shape (N,) with the PokerHand category of every row.
+    """
+    cards = np.asarray(cards, dtype=np.int64)
+    if len(cards) <= SMALL_BATCH_SIZE:  # the fixed cost of the vectorized path outweighs a few table reads
+        values = np.array([evaluate_cards(row) for row in cards.tolist()], dtype=np.int64)
+        return values, values >> CATEGORY_SHIFT
+    tables = batch_lookup_tables()
+    ranks, suits = cards >> 2, cards & 3
+    rank_bits = np.int64(1) << ranks
+
+    rows = np.arange(len(cards))[:, None]
+    rank_counts = np.bincount((rows * N_RANKS + ranks).ravel(), minlength=len(cards) * N_RANKS)
+    rank_counts = rank_counts.reshape(-1, N_RANKS)
+    suit_counts = np.bincount((rows * len(SUITS) + suits).ravel(), minlength=len(cards) * len(SUITS))
+    suit_counts = suit_counts.reshape(-1, len(SUITS))
+    rank_mask = np.bitwise_or.reduce(rank_bits, axis=1)
+
+    # the two largest groups of equal ranks, ordered by their size first and by their rank second
+    group_keys = rank_counts << RANK_BITS | np.arange(N_RANKS)
+    first_group = group_keys.max(axis=1)
+    second_group = np.where(group_keys == first_group[:, None], 0, group_keys).max(axis=1)
+    groups = np.stack([first_group, second_group], axis=1)
+    group_ranks, group_sizes = groups & 15, groups >> RANK_BITS
+    first_bit, second_bit = np.int64(1) << group_ranks[:, 0], np.int64(1) << group_ranks[:, 1]
+    without_first = rank_mask & ~first_bit
+    without_two = without_first & ~second_bit
+    straight_highs = tables.straight_highs[rank_mask]
+    top = tables.top_ranks
+
+    first_two = group_ranks[:, 0] << 16 | group_ranks[:, 1] << 12
+    conditions = [
+        group_sizes[:, 0] == 4,
+        (group_sizes[:, 0] == 3) & (group_sizes[:, 1] >= 2),
+        straight_highs >= 0,
+        group_sizes[:, 0] == 3,
+        (group_sizes[:, 0] == 2) & (group_sizes[:, 1] == 2),
+        group_sizes[:, 0] == 2,
+    ]
+    choices = [
+        PokerHand.FOUR_OF_A_KIND << CATEGORY_SHIFT | group_ranks[:, 0] << 16 | top[1, without_first] << 12,
+        PokerHand.FULL_HOUSE << CATEGORY_SHIFT | first_two,
+        PokerHand.STRAIGHT << CATEGORY_SHIFT | straight_highs << 16,
+        PokerHand.THREE_OF_A_KIND << CATEGORY_SHIFT | group_ranks[:, 0] << 16 | top[2, without_first] << 8,
+        PokerHand.TWO_PAIR << CATEGORY_SHIFT | first_two | top[1, without_two] << 8,
+        PokerHand.ONE_PAIR << CATEGORY_SHIFT | group_ranks[:, 0] << 16 | top[3, without_first] << 4,
+    ]
+    values = np.select(conditions, choices,
+                       default=PokerHand.HIGH_CARD << CATEGORY_SHIFT | top[MAX_CARDS_IN_HAND, rank_mask])
+
+    # quads and full houses can't be made together with a flush out of 7 cards
+    flush_rows = np.flatnonzero(suit_counts.max(axis=1) >= MAX_CARDS_IN_HAND)
+    flush_suits = suit_counts[flush_rows].argmax(axis=1)
+    flush_masks = np.where(suits[flush_rows] == flush_suits[:, None], rank_bits[flush_rows], 0).sum(axis=1)
+    values[flush_rows] = tables.flush_values[flush_masks]
+    return values, values >> CATEGORY_SHIFT
 
 
 class Mind:
@@ -33,41 +340,9 @@ class Mind:
     def __init__(self, cards: list[PlayingCard]):
         self.cards = cards
 
-    @staticmethod
-    def _is_straight(cards) -> bool:
-        ranks_ace_first = sorted(set(CARD_RANKS_TO_INT_ACE_FIRST[card.rank] for card in cards))
-        ranks_ace_last = sorted(set(CARD_RANKS_TO_INT_ACE_LAST[card.rank] for card in cards))
-        is_straight = False
-        for ranks in [ranks_ace_first, ranks_ace_last]:
-            if len(ranks) == MAX_CARDS_IN_HAND and ranks[-1] - ranks[0] == (MAX_CARDS_IN_HAND - 1):
-                is_straight = True
-        return is_straight
+    def evaluate_hand_value(self) -> int:
+        """Fully ordered value of the best hand, suitable for breaking ties."""
+        return evaluate_cards([card.index for card in self.cards])
 
     def evaluate_hand_strength(self) -> PokerHand:
-        rank_counts = Counter(CARD_RANKS_TO_INT_ACE_FIRST[card.rank] for card in self.cards)
-        max_ranks = max(rank_counts.values())
-        if max_ranks == 4:
-            return PokerHand.FOUR_OF_A_KIND
-        elif max_ranks == 3 and 2 in rank_counts.values():
-            return PokerHand.FULL_HOUSE
-        elif self.cards >= MAX_CARDS_IN_HAND:
-            all_card_combinations = combinations(self.cards, MAX_CARDS_IN_HAND)
-            for combination in all_card_combinations:
-                if len(set(card.suit for card in combination)) == 1:  # is flush
-                    ranks_ace_last = sorted(set(CARD_RANKS_TO_INT_ACE_LAST[card.rank] for card in combination))
-                    if ranks_ace_last == ROYAL_FLUSH_RANKS:
-                        return PokerHand.ROYAL_FLUSH
-                    if self._is_straight(combination):
-                        return PokerHand.STRAIGHT_FLUSH
-                    else:
-                        return PokerHand.FLUSH
-                elif self._is_straight(combination):  # no flush but straight
-                    return PokerHand.STRAIGHT
-        elif max_ranks == 3:
-            return PokerHand.THREE_OF_A_KIND
-        elif list(rank_counts.values()).count(2) == 2:
-            return PokerHand.TWO_PAIR
-        elif max_ranks == 2:
-            return PokerHand.ONE_PAIR
-        else:
-            return PokerHand.HIGH_CARD
+        return hand_category(self.evaluate_hand_value())
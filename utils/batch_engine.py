@@ -0,0 +1,272 @@
+from functools import cached_property
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from utils.ai import evaluate_batch
+from utils.cards import N_CARDS
+from utils.equity import N_COMMUNITY_CARDS, N_HOLE_CARDS, STAGE_COMMUNITY_CARDS
+
+
+LAST_STAGE_IDX = len(STAGE_COMMUNITY_CARDS) - 1
+NO_LEVEL = np.iinfo(np.int64).max  # level of the seats which aren't all-in
+
+
+class BatchObservation:
+    """What the players to act at a number of tables see, one row per table.
+    Fields are computed on first access, so that simple policies don't pay for the ones they don't use.
+
+    Attributes
+    ----------
+    stage_idx : np.ndarray
+        Stage of every table, see Round.stage_idx.
+    hole_cards : np.ndarray
+        Integer-encoded cards of the player to act, shape (n, 2).
+    community_cards : np.ndarray
+        Cards on the table, shape (n, 5), -1 for the cards which haven't been dealt yet.
+    to_call : np.ndarray
+        Amount the player has to add to match the highest bet of the stage.
+    funds : np.ndarray
+        Funds the player has left.
+    pot : np.ndarray
+        Amount in the bank.
+    n_opponents : np.ndarray
+        Number of other players still in the round.
+    """
+
+    def __init__(self, batch: 'BatchTables', tables: np.ndarray):
+        self._batch, self._tables = batch, tables
+        self._seats = batch.active[tables]
+
+    def __len__(self):
+        return len(self._tables)
+
+    @cached_property
+    def stage_idx(self) -> np.ndarray:
+        return self._batch.stage_idx[self._tables]
+
+    @cached_property
+    def hole_cards(self) -> np.ndarray:
+        return self._batch.hole_cards[self._tables, self._seats]
+
+    @cached_property
+    def community_cards(self) -> np.ndarray:
+        n_visible = np.asarray(STAGE_COMMUNITY_CARDS)[self.stage_idx]
+        visible = np.arange(N_COMMUNITY_CARDS) < n_visible[:, None]
+        return np.where(visible, self._batch.boards[self._tables], -1)
+
+    @cached_property
+    def to_call(self) -> np.ndarray:
+        return self._batch.max_bet[self._tables] - self._batch.bets[self._tables, self._seats]
+
+    @cached_property
+    def funds(self) -> np.ndarray:
+        return self._batch.stacks[self._tables, self._seats]
+
+    @cached_property
+    def pot(self) -> np.ndarray:
+        return self._batch.pot[self._tables]
+
+    @cached_property
+    def n_opponents(self) -> np.ndarray:
+        return self._batch.n_live[self._tables] - 1
+
+
+BatchPolicy = Callable[[BatchObservation], np.ndarray]  # returns bets, -1 to fold
+
+
+def passive_batch_policy(observation: BatchObservation) -> np.ndarray:
+    """Never fold and never raise: check when possible, call otherwise."""
+    return observation.to_call
+
+
+class BatchTables:
+    """Many independent tables playing a single round each, stepped in lockstep.
+
+    Every table follows the rules of Round: seat 0 has the button and posts the small blind,
+    seat 1 the big blind, bets are capped at the funds of the seat, a stage is over once every seat
+    which can act has acted and matched the highest bet, and every pot is split between the best hands
+    competing for it with the remainder going to the first winner in the order of the turn, see SidePots.
+    Every call of `step` does at every unfinished table what a call of Round.next_event does: one action,
+    a transition to the next stage or the showdown.
+
+    Attributes
+    ----------
+    n_tables : int
+        Number of tables.
+    n_seats : int
+        Number of players at every table.
+    decks : np.ndarray
+        Shuffled deck of every table, shape (n_tables, 52). Seat i holds cards 2i and 2i + 1,
+        the community cards follow the hole cards.
+    stacks, bets : np.ndarray
+        Funds and bets of the current stage, shape (n_tables, n_seats).
+    contributions : np.ndarray
+        Total amount every seat has put into the bank, shape (n_tables, n_seats).
+    acted, folded, all_in, can_act : np.ndarray
+        Statuses of the seats, shape (n_tables, n_seats).
+    pot, max_bet, n_live, stage_idx, active, n_actions : np.ndarray
+        Per table values, see TableState.
+    finished : np.ndarray
+        Mask of the tables whose round is over.
+    winners : np.ndarray
+        Mask of the seats which won a part of the bank, shape (n_tables, n_seats).
+    """
+
+    def __init__(self, n_tables: int, n_seats: int, stacks=200, small_blind: int = 1, big_blind: int = 2,
+                 seeds: Optional[Sequence[int]] = None, rng: Optional[np.random.Generator] = None):
+        """Shuffle the decks and post the blinds.
+
+        With `seeds` every table shuffles its deck with its own generator, the same way as
+        `Round(players, deck=Deck(np.random.default_rng(seed), shuffled=False))` does, so the tables
+        reproduce scalar rounds. Otherwise all decks are shuffled at once with `rng`.
+        """
+        self.n_tables, self.n_seats = n_tables, n_seats
+        if seeds is not None:
+            self.decks = np.stack([np.random.default_rng(seed).permutation(N_CARDS) for seed in seeds])
+        else:
+            rng = np.random.default_rng() if rng is None else rng
+            self.decks = rng.permuted(np.tile(np.arange(N_CARDS), (n_tables, 1)), axis=1)
+        self.hole_cards = self.decks[:, :N_HOLE_CARDS * n_seats].reshape(n_tables, n_seats, N_HOLE_CARDS)
+        self.boards = self.decks[:, N_HOLE_CARDS * n_seats:N_HOLE_CARDS * n_seats + N_COMMUNITY_CARDS]
+
+        self.stacks = np.broadcast_to(np.asarray(stacks, dtype=np.int64), (n_tables, n_seats)).copy()
+        self.bets = np.zeros((n_tables, n_seats), dtype=np.int64)
+        self.contributions = np.zeros((n_tables, n_seats), dtype=np.int64)
+        self.acted = np.zeros((n_tables, n_seats), dtype=bool)
+        self.folded = np.zeros((n_tables, n_seats), dtype=bool)
+        self.all_in = self.stacks <= 0
+        self.can_act = ~self.all_in
+        self.winners = np.zeros((n_tables, n_seats), dtype=bool)
+        self.pot = np.zeros(n_tables, dtype=np.int64)
+        self.max_bet = np.zeros(n_tables, dtype=np.int64)
+        self.n_live = np.full(n_tables, n_seats)
+        self.stage_idx = np.zeros(n_tables, dtype=np.int64)
+        self.active = np.zeros(n_tables, dtype=np.int64)
+        self.n_actions = np.zeros(n_tables, dtype=np.int64)
+        self.finished = np.zeros(n_tables, dtype=bool)
+
+        all_tables = np.arange(n_tables)
+        self._bet(all_tables, np.full(n_tables, small_blind))
+        self._bet(all_tables, np.full(n_tables, big_blind))
+
+    def _next_seats(self, tables: np.ndarray, seats: np.ndarray) -> np.ndarray:
+        """The first seat after the given one which can act at every table, -1 if there is none."""
+        following = (seats[:, None] + np.arange(1, self.n_seats)) % self.n_seats
+        candidates = self.can_act[tables[:, None], following]
+        first = candidates.argmax(axis=1)
+        return np.where(candidates.any(axis=1), following[np.arange(len(tables)), first], -1)
+
+    def _bet(self, tables: np.ndarray, amounts: np.ndarray):
+        seats = self.active[tables]
+        amounts = np.minimum(amounts, self.stacks[tables, seats])
+        self.stacks[tables, seats] -= amounts
+        self.bets[tables, seats] += amounts
+        self.contributions[tables, seats] += amounts
+        self.pot[tables] += amounts
+        self.max_bet[tables] = np.maximum(self.max_bet[tables], self.bets[tables, seats])
+        self.acted[tables, seats] = True
+        broke = self.stacks[tables, seats] <= 0
+        self.all_in[tables[broke], seats[broke]] = True
+        self.can_act[tables[broke], seats[broke]] = False
+        self.active[tables] = self._next_seats(tables, seats)
+
+    def _fold(self, tables: np.ndarray):
+        seats = self.active[tables]
+        self.folded[tables, seats] = True
+        self.can_act[tables, seats] = False
+        self.n_live[tables] -= 1
+        self.active[tables] = self._next_seats(tables, seats)
+
+    def stage_over(self, tables: np.ndarray) -> np.ndarray:
+        """Whether every seat which can act has acted and matched the highest bet at every table."""
+        pending = ~self.acted[tables] | (self.bets[tables] != self.max_bet[tables, None])
+        return ~(self.can_act[tables] & pending).any(axis=1)
+
+    def observe(self, tables: np.ndarray) -> BatchObservation:
+        """Observations of the players to act at the given tables."""
+        return BatchObservation(self, tables)
+
+    def _start_next_stage(self, tables: np.ndarray):
+        self.stage_idx[tables] += 1
+        self.bets[tables] = 0
+        self.acted[tables] = False
+        self.max_bet[tables] = 0
+        button = np.zeros(len(tables), dtype=np.int64)
+        self.active[tables] = np.where(self.can_act[tables, 0], 0, self._next_seats(tables, button))
+
+    def _open_up(self, tables: np.ndarray):
+        n = len(tables)
+        cards = np.concatenate([self.hole_cards[tables],
+                                np.broadcast_to(self.boards[tables, None, :], (n, self.n_seats, N_COMMUNITY_CARDS))],
+                               axis=2)
+        values, _ = evaluate_batch(cards.reshape(n * self.n_seats, N_HOLE_CARDS + N_COMMUNITY_CARDS))
+        values = values.reshape(n, self.n_seats)
+        payouts = np.zeros((n, self.n_seats), dtype=np.int64)
+        contributions = self.contributions[tables]
+        live = ~self.folded[tables]
+        # pot layers between consecutive all-in levels, resolved from the top one down as in SidePots.award
+        levels = np.sort(np.where(self.all_in[tables] & (contributions > 0), contributions, NO_LEVEL), axis=1)
+        bottoms = np.concatenate([np.zeros((n, 1), dtype=np.int64), levels[:, :-1]], axis=1)
+        highest_level = np.where(levels < NO_LEVEL, levels, 0).max(axis=1)
+        carry = np.zeros(n, dtype=np.int64)
+        for layer in range(self.n_seats, -1, -1):
+            if layer == self.n_seats:
+                bottom, top = highest_level, np.full(n, NO_LEVEL)
+                eligible = live & (contributions > bottom[:, None])
+                real = np.ones(n, dtype=bool)
+            else:
+                bottom, top = bottoms[:, layer], levels[:, layer]
+                eligible = live & (contributions >= top[:, None])
+                real = (top < NO_LEVEL) & (top > bottom)
+            amount = (np.minimum(contributions, top[:, None]) - np.minimum(contributions, bottom[:, None])).sum(axis=1)
+            amount = np.where(real, amount + carry, 0)
+            contested = real & eligible.any(axis=1)
+            carry = np.where(real, np.where(contested, 0, amount), carry)
+            best = np.where(eligible, values, -1).max(axis=1)
+            winners = eligible & (values == best[:, None]) & contested[:, None]
+            payouts += self._split(tables, np.where(contested, amount, 0), winners)
+        self._finish(tables, payouts)
+
+    def _split(self, tables: np.ndarray, amounts: np.ndarray, winners: np.ndarray) -> np.ndarray:
+        """Split the amounts between the winners, the remainder goes to the first of them
+        in the order of the turn, which starts from the active seat.
+        """
+        share, remainder = np.divmod(amounts, np.maximum(winners.sum(axis=1), 1))
+        payouts = winners * share[:, None]
+        start = np.where(self.active[tables] >= 0, self.active[tables], 0)
+        turn_distance = np.where(winners, (np.arange(self.n_seats) - start[:, None]) % self.n_seats, self.n_seats)
+        payouts[np.arange(len(tables)), turn_distance.argmin(axis=1)] += remainder
+        return payouts
+
+    def _finish(self, tables: np.ndarray, payouts: np.ndarray):
+        self.stacks[tables] += payouts
+        self.pot[tables] = 0
+        self.winners[tables] = payouts > 0
+        self.finished[tables] = True
+
+    def step(self, policy: BatchPolicy = passive_batch_policy):
+        """Make every unfinished table move on by one event."""
+        tables = np.flatnonzero(~self.finished)
+        over = self.stage_over(tables)
+        last_stage = self.stage_idx[tables] == LAST_STAGE_IDX
+        self._start_next_stage(tables[over & ~last_stage])
+        self._open_up(tables[over & last_stage])
+
+        acting = tables[~over]
+        if len(acting):
+            bets = np.asarray(policy(self.observe(acting)), dtype=np.int64)
+            self.n_actions[acting] += 1
+            folds = bets == -1
+            self._fold(acting[folds])
+            self._bet(acting[~folds], bets[~folds])
+            alone = acting[self.n_live[acting] == 1]  # everybody else folded
+            self._finish(alone, self._split(alone, self.pot[alone], ~self.folded[alone]))
+
+    def play(self, policy: BatchPolicy = passive_batch_policy, max_steps: int = 10_000):
+        """Step until every round is over."""
+        for _ in range(max_steps):
+            if self.finished.all():
+                return self
+            self.step(policy)
+        raise RuntimeError('The rounds do not end, check that the policy matches the highest bet.')
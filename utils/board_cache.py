@@ -0,0 +1,300 @@
+import sys
+from collections import OrderedDict
+from itertools import combinations
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+import numpy as np
+
+from utils.ai import N_RANKS, evaluate_batch
+from utils.cards import N_CARDS, SUITS
+from utils.equity import N_COMMUNITY_CARDS, Cards, to_card_ints
+
+if TYPE_CHECKING:
+    from multiprocessing import shared_memory  # imported by the processes which share boards only
+
+
+COMBOS = np.array(list(combinations(range(N_CARDS), 2)))  # every pair of hole cards, lower card first
+N_COMBOS = len(COMBOS)  # 1326
+COMBO_INDEX = np.full((N_CARDS, N_CARDS), -1)
+COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(N_COMBOS)
+# the combos holding every card, shape (N_CARDS, N_CARDS - 1)
+CARD_COMBOS = np.array([COMBO_INDEX[card, np.arange(N_CARDS) != card] for card in range(N_CARDS)])
+MIN_BOARD_CARDS = 3  # two hole cards and at least three community cards make a hand
+MIN_FLUSH_DRAW = 3  # board cards of a suit from which the suits of the hole cards matter
+N_BOARD_CLASSES = N_RANKS * N_RANKS * 4  # classes of equal value on a board, see evaluate_boards
+BOARD_CACHE_SIZE = 4_096
+VALUE_DTYPE = np.int32  # hand values take 24 bits, see utils.ai
+HEADER_DTYPE = np.int64  # number of the boards of a shared table
+
+
+class CacheInfo(NamedTuple):
+    """Counters of a BoardCache, in the manner of functools.lru_cache.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Lookups answered by the cache and boards which had to be evaluated.
+    shared_hits : int
+        Lookups answered by the shared table after missing the cache of the process.
+    size, maxsize : int
+        Boards held by the cache of the process and how many it may hold.
+    """
+    hits: int
+    misses: int
+    shared_hits: int
+    size: int
+    maxsize: int
+
+
+def board_key(board: Cards) -> int:
+    """Canonical encoding of a board: the bitmask of its cards, which doesn't depend on their order."""
+    key = 0
+    for card in to_card_ints(board):
+        key |= 1 << card
+    return key
+
+
+def evaluate_board(board: Cards) -> np.ndarray:
+    """Hand value of every combo on a board, -1 for the combos holding a board card."""
+    return evaluate_boards(np.array([to_card_ints(board)]))[0]
+
+
+def evaluate_boards(boards: np.ndarray) -> np.ndarray:
+    """Hand values of every combo on several boards of the same size given as integer-encoded cards of
+    shape (n, k), evaluated together in one batch, shape (n, N_COMBOS) with -1 for the blocked combos.
+
+    Only one combo of every class of equal value is evaluated: the value depends on the ranks of the
+    hole cards and, when the board holds at least three cards of a suit, on which of them have that suit.
+    """
+    boards = np.asarray(boards, dtype=np.int64).reshape(len(boards), -1)
+    if not MIN_BOARD_CARDS <= boards.shape[1] <= N_COMMUNITY_CARDS:
+        raise ValueError(f'A board has from {MIN_BOARD_CARDS} to {N_COMMUNITY_CARDS} cards, '
+                         f'got {boards.shape[1]}.')
+    blocked = np.zeros((len(boards), N_COMBOS), dtype=bool)
+    blocked[np.arange(len(boards))[:, None, None], CARD_COMBOS[boards]] = True
+    board_idx, combo_idx = np.nonzero(~blocked)
+    combos = COMBOS[combo_idx]
+    suit_counts = ((boards & 3)[:, :, None] == np.arange(len(SUITS))).sum(axis=1)
+    flush_suit = np.where(suit_counts.max(axis=1) >= MIN_FLUSH_DRAW, suit_counts.argmax(axis=1), -1)
+    suited = (combos & 3) == flush_suit[board_idx, None]
+    classes = ((combos[:, 0] >> 2) * N_RANKS + (combos[:, 1] >> 2)) << 2 | suited[:, 0] << 1 | suited[:, 1]
+    _, representatives, inverse = np.unique(board_idx * N_BOARD_CLASSES + classes,
+                                            return_index=True, return_inverse=True)
+    class_values, _ = evaluate_batch(np.concatenate([combos[representatives],
+                                                     boards[board_idx[representatives]]], axis=1))
+    values = np.full((len(boards), N_COMBOS), -1, dtype=VALUE_DTYPE)
+    values[board_idx, combo_idx] = class_values[inverse.ravel()]
+    return values
+
+
+_created_blocks: set[str] = set()  # names of the shared tables created by the process
+
+
+class SharedBoardTable:
+    """Evaluated boards published in shared memory, read by every process which attaches to it.
+
+    The block holds the number of boards, their sorted keys and then their values, one row of
+    N_COMBOS values per board. The table is written once by `create` and never changes.
+
+    Attributes
+    ----------
+    memory : shared_memory.SharedMemory
+        Block of the table.
+    keys : np.ndarray
+        Sorted keys of the boards, see board_key.
+    values : np.ndarray
+        Values of the combos on every board, shape (n_boards, N_COMBOS).
+    """
+
+    def __init__(self, memory: 'shared_memory.SharedMemory'):
+        self.memory = memory
+        n_boards = int(np.ndarray(1, dtype=HEADER_DTYPE, buffer=memory.buf)[0])
+        offset = np.dtype(HEADER_DTYPE).itemsize
+        self.keys = np.ndarray(n_boards, dtype=np.uint64, buffer=memory.buf, offset=offset)
+        offset += self.keys.nbytes
+        self.values = np.ndarray((n_boards, N_COMBOS), dtype=VALUE_DTYPE, buffer=memory.buf, offset=offset)
+        self.keys.setflags(write=False)
+        self.values.setflags(write=False)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    @classmethod
+    def create(cls, boards: dict[int, np.ndarray], name: Optional[str] = None) -> 'SharedBoardTable':
+        """Copy the values of the boards, given by their keys, into a new block.
+        The creator owns the block and should `unlink` it once no process needs it.
+        """
+        from multiprocessing import shared_memory
+        keys = np.array(sorted(boards), dtype=np.uint64)
+        size = np.dtype(HEADER_DTYPE).itemsize + keys.nbytes + len(keys) * N_COMBOS * np.dtype(VALUE_DTYPE).itemsize
+        memory = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        _created_blocks.add(memory.name)
+        np.ndarray(1, dtype=HEADER_DTYPE, buffer=memory.buf)[0] = len(keys)
+        offset = np.dtype(HEADER_DTYPE).itemsize
+        np.ndarray(len(keys), dtype=np.uint64, buffer=memory.buf, offset=offset)[:] = keys
+        offset += keys.nbytes
+        values = np.ndarray((len(keys), N_COMBOS), dtype=VALUE_DTYPE, buffer=memory.buf, offset=offset)
+        for row, key in enumerate(keys.tolist()):
+            values[row] = boards[key]
+        return cls(memory)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedBoardTable':
+        """Open a table created by another process. The block is left out of the resource tracker of the
+        process, which would otherwise unlink it when the process exits, so the creator keeps owning it.
+        """
+        from multiprocessing import shared_memory
+        if sys.version_info >= (3, 13):
+            return cls(shared_memory.SharedMemory(name=name, track=False))
+        from multiprocessing import resource_tracker
+        memory = shared_memory.SharedMemory(name=name)
+        if memory.name not in _created_blocks:  # the creator and its forked workers share one tracker
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return cls(memory)
+
+    def get(self, key: int) -> Optional[np.ndarray]:
+        """Values of the board with the key, None if the table doesn't hold it."""
+        row = int(np.searchsorted(self.keys, np.uint64(key)))
+        if row < len(self.keys) and int(self.keys[row]) == key:
+            return self.values[row]
+        return None
+
+    def close(self):
+        """Detach the process from the block, the arrays of the table can't be used afterwards."""
+        del self.keys, self.values
+        self.memory.close()
+
+    def unlink(self):
+        """Free the block once every process has closed it, called by its creator."""
+        self.memory.unlink()
+        _created_blocks.discard(self.memory.name)
+
+
+class BoardCache:
+    """Values of every hole-card combo on the recently seen boards, evicting the least recently used board.
+
+    A board is evaluated once for all the 1326 combos, after which the hand of any player on it,
+    and the whole range of an opponent, is a lookup. Boards are keyed by board_key, so the order
+    of the cards doesn't matter. Boards of a SharedBoardTable are read from shared memory instead
+    of being evaluated, which lets the processes of a simulation share a cache warmed up once.
+
+    Attributes
+    ----------
+    maxsize : int
+        Number of boards held by the cache of the process.
+    shared : Optional[SharedBoardTable]
+        Table looked into before evaluating a board missing from the cache.
+    hits, misses, shared_hits : int
+        Counters of the lookups, see CacheInfo.
+    """
+
+    def __init__(self, maxsize: int = BOARD_CACHE_SIZE, shared: Optional[SharedBoardTable] = None):
+        self.maxsize = maxsize
+        self.shared = shared
+        self.hits = self.misses = self.shared_hits = 0
+        self._boards: OrderedDict[int, np.ndarray] = OrderedDict()
+
+    def __len__(self):
+        return len(self._boards)
+
+    def __contains__(self, board: Cards) -> bool:
+        return board_key(board) in self._boards
+
+    def values(self, board: Cards) -> np.ndarray:
+        """Read-only hand value of every combo on the board, in the order of COMBOS,
+        -1 for the combos holding a board card.
+        """
+        key = board_key(board)
+        values = self._lookup(key)
+        if values is None:
+            self.misses += 1
+            values = evaluate_board(board)
+            self._store(key, values)
+        return values
+
+    def values_many(self, boards: np.ndarray) -> np.ndarray:
+        """Values of several boards of the same size, shape (n, N_COMBOS), the boards missing from the cache
+        being evaluated together in one batch.
+        """
+        boards = np.asarray(boards, dtype=np.int64)
+        keys = [board_key(board) for board in boards.tolist()]
+        values = np.empty((len(boards), N_COMBOS), dtype=VALUE_DTYPE)
+        missing = []
+        for row, key in enumerate(keys):
+            cached = self._lookup(key)
+            if cached is None:
+                missing.append(row)
+            else:
+                values[row] = cached
+        if missing:
+            self.misses += len(missing)
+            evaluated = evaluate_boards(boards[missing])
+            values[missing] = evaluated
+            for row, board_values in zip(missing, evaluated):
+                self._store(keys[row], board_values)
+        return values
+
+    def _lookup(self, key: int) -> Optional[np.ndarray]:
+        values = self._boards.get(key)
+        if values is not None:
+            self.hits += 1
+            self._boards.move_to_end(key)
+            return values
+        values = None if self.shared is None else self.shared.get(key)
+        if values is not None:
+            self.shared_hits += 1
+            self._store(key, values)
+        return values
+
+    def _store(self, key: int, values: np.ndarray):
+        values.setflags(write=False)
+        self._boards[key] = values
+        if len(self._boards) > self.maxsize:
+            self._boards.popitem(last=False)
+
+    def hand_values(self, hole_cards: np.ndarray, board: Cards) -> np.ndarray:
+        """Values of the hands of several players on the same board, hole cards of shape (n, 2)."""
+        hole_cards = np.asarray(hole_cards)
+        return self.values(board)[COMBO_INDEX[hole_cards[:, 0], hole_cards[:, 1]]]
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.shared_hits, len(self._boards), self.maxsize)
+
+    def clear(self):
+        """Drop the boards of the process and reset the counters, a shared table stays attached."""
+        self._boards.clear()
+        self.hits = self.misses = self.shared_hits = 0
+
+    def detach(self):
+        """Close the shared table, if any. The boards of the process are dropped as well,
+        since the ones read from the table point into its block.
+        """
+        if self.shared is not None:
+            self._boards.clear()
+            self.shared.close()
+            self.shared = None
+
+    def share(self, name: Optional[str] = None) -> SharedBoardTable:
+        """Publish the boards of the cache, together with the ones of its shared table, for other processes
+        to attach to. The caller owns the returned table and should unlink it when the work is done.
+        """
+        boards = {} if self.shared is None else dict(zip(self.shared.keys.tolist(), self.shared.values))
+        boards.update(self._boards)
+        return SharedBoardTable.create(boards, name)
+
+
+BOARD_CACHE = BoardCache()  # shared by the equity code of the process
+
+
+def attach_board_cache(name: str):
+    """Let the default cache of the process read the shared table with the given name,
+    meant as the initializer of the worker processes. The table is closed when the process exits.
+    """
+    from multiprocessing import util
+    BOARD_CACHE.shared = SharedBoardTable.attach(name)
+    # run by the exit of worker processes as well, which skips the atexit handlers
+    util.Finalize(BOARD_CACHE, BOARD_CACHE.detach, exitpriority=0)
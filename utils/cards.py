@@ -1,34 +1,144 @@
 import random
 from dataclasses import dataclass, field
+from typing import Union
 
 
 RANKS = '2 3 4 5 6 7 8 9 10 jack queen king ace'.split()
 SUITS = 'clubs diamonds hearts spades'.split()
+N_CARDS = len(RANKS) * len(SUITS)
 
+RANK_TO_INT = {rank: i for i, rank in enumerate(RANKS)}
+SUIT_TO_INT = {suit: i for i, suit in enumerate(SUITS)}
 
-@dataclass(frozen=True)
+
+def card_to_int(rank: str, suit: str) -> int:
+    """Encode a card as an integer in the range 0-51.
+    The rank occupies the upper bits and the suit the lowest two bits,
+    so that `index >> 2` is the rank and `index & 3` is the suit.
+    """
+    return RANK_TO_INT[rank] << 2 | SUIT_TO_INT[suit]
+
+
+def int_to_card(index: int) -> 'PlayingCard':
+    """Decode an integer in the range 0-51 back into a playing card."""
+    return CARDS[index]
+
+
+_INTERNED_CARDS = {}
+
+
+@dataclass(frozen=True, slots=True)
 class PlayingCard:
+    """A playing card. There is a single instance of every card, constructing it again
+    returns the existing one.
+    """
     rank: str
     suit: str
+    index: int = field(init=False, repr=False, compare=False)
+
+    def __new__(cls, rank, suit):
+        card = _INTERNED_CARDS.get((rank, suit))
+        return object.__new__(cls) if card is None else card
+
+    def __post_init__(self):
+        object.__setattr__(self, 'index', card_to_int(self.rank, self.suit))
+
+    def __reduce__(self):
+        return int_to_card, (self.index,)
+
+
+CARDS = tuple(PlayingCard(RANKS[index >> 2], SUITS[index & 3]) for index in range(N_CARDS))
+_INTERNED_CARDS.update(((card.rank, card.suit), card) for card in CARDS)
+
+
+def cards_to_ints(cards: list[PlayingCard]) -> list[int]:
+    """Integer representation of a list of cards."""
+    return [card.index for card in cards]
 
 
-def make_french_deck():
+def make_french_deck(rng=None):
     """Make a shuffled deck of cards."""
-    deck = [PlayingCard(r, s) for s in SUITS for r in RANKS]
-    random.shuffle(deck)
+    deck = list(CARDS)
+    (random if rng is None else rng).shuffle(deck)
     return deck
 
 
-@dataclass
 class Deck:
-    """A deck of cards class with some added behavior."""
-    cards: list[PlayingCard] = field(default_factory=make_french_deck)
+    """A deck of cards class with some added behavior.
 
-    def deal(self, num_cards=1):
-        """Get cards out of the deck."""
-        if num_cards <= len(self.cards):
-            dealt_cards = self.cards[:num_cards]
-            self.cards = self.cards[num_cards:]
+    The deck is a list of card indices which is shuffled in place and dealt by moving a cursor,
+    so neither dealing nor reshuffling creates new objects.
+
+    Attributes
+    ----------
+    rng
+        Source of randomness with a `shuffle` method, e.g. `random.Random` or `numpy.random.Generator`.
+        Defaults to the `random` module.
+    order : list[int]
+        Indices of the cards, the ones before the cursor have been dealt.
+    cursor : int
+        Position of the next card to deal.
+    """
+
+    def __init__(self, rng=None, shuffled=True):
+        self.rng = random if rng is None else rng
+        self.order = list(range(N_CARDS))
+        self.cursor = 0
+        self._positions = list(range(N_CARDS))  # where every card is in the order
+        self._positions_valid = True
+        if shuffled:
+            self.shuffle()
+
+    def __len__(self):
+        return N_CARDS - self.cursor
+
+    @property
+    def cards(self) -> list[PlayingCard]:
+        """Cards which haven't been dealt yet."""
+        return [CARDS[index] for index in self.order[self.cursor:]]
+
+    def shuffle(self, rng=None):
+        """Put all the cards back into the deck and shuffle it. A new rng replaces the old one and
+        the deck is put in order first, so that the result depends only on the new rng.
+        """
+        if rng is not None:
+            self.rng = rng
+            self.order.sort()
+        self.rng.shuffle(self.order)
+        self.cursor = 0
+        self._positions_valid = False
+
+    def deal_indices(self, num_cards=1) -> list[int]:
+        """Get integer-encoded cards out of the deck."""
+        if num_cards <= len(self):
+            dealt_cards = self.order[self.cursor:self.cursor + num_cards]
+            self.cursor += num_cards
             return dealt_cards
         else:
             raise ValueError('There are less cards in the deck than you want to take.')
+
+    def deal(self, num_cards=1):
+        """Get cards out of the deck."""
+        return [CARDS[index] for index in self.deal_indices(num_cards)]
+
+    def remove(self, cards: list[Union[PlayingCard, int]]):
+        """Take known cards out of the deck, e.g. the ones seen in hands or on the table.
+        Every card is swapped with the next card to deal, which keeps the rest of the deck randomly ordered.
+        """
+        if not self._positions_valid:
+            for position, index in enumerate(self.order):
+                self._positions[index] = position
+            self._positions_valid = True
+        for card in cards:
+            index = card.index if isinstance(card, PlayingCard) else card
+            position = self._positions[index]
+            if position < self.cursor:
+                raise ValueError('The card is not in the deck anymore.')
+            next_card = self.order[self.cursor]
+            self.order[self.cursor], self.order[position] = index, next_card
+            self._positions[index], self._positions[next_card] = self.cursor, position
+            self.cursor += 1
+
+    def remaining_indices(self) -> list[int]:
+        """Integer-encoded cards which haven't been dealt yet."""
+        return self.order[self.cursor:]
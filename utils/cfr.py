@@ -0,0 +1,442 @@
+import argparse
+import copy
+import json
+import pathlib
+import time
+from concurrent.futures import Executor
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Iterator, Optional
+
+import numpy as np
+
+from utils.ai import evaluate_batch
+from utils.cards import N_CARDS
+from utils.equity import N_COMMUNITY_CARDS, N_HOLE_CARDS, STAGE_COMMUNITY_CARDS
+from utils.policies import DEFAULT_STRENGTH_SAMPLES, Observation, postflop_strength, preflop_strength
+from utils.table_state import TableState
+
+
+N_STAGES = len(STAGE_COMMUNITY_CARDS)
+FOLD, CALL, RAISE = range(3)  # abstract actions, a call with nothing to call is a check
+N_ACTIONS = 3
+DECISION, FOLD_END, SHOWDOWN = range(3)  # kinds of the nodes of the betting tree
+DEFAULT_ITERATIONS_PER_TASK = 200
+DEFAULT_EVALUATION_DEALS = 2_000
+CFR_DIR = pathlib.Path(__file__).parent.parent / 'assets' / 'cfr'
+
+
+@dataclass(frozen=True)
+class Abstraction:
+    """Fixed-limit abstraction of a round played by the rules of Round: seat 0 posts the small blind,
+    seat 1 the big blind, every stage starts from seat 0 and is over once every seat which can act
+    has acted and matched the highest bet. Hands are bucketed by their strength, see `bucket_hands`.
+
+    Attributes
+    ----------
+    n_players : int
+        Number of seats.
+    n_buckets : int
+        Number of strength buckets of the hands at every stage.
+    small_blind, big_blind : int
+        Blinds.
+    raise_sizes : tuple[int, ...]
+        Size of a raise at every stage.
+    max_raises : int
+        Number of raises per stage after which the players can only call or fold.
+    stack : int
+        Funds of every seat, deep enough for nobody to go all-in.
+    """
+    n_players: int = 2
+    n_buckets: int = 8
+    small_blind: int = 1
+    big_blind: int = 2
+    raise_sizes: tuple[int, ...] = (2, 2, 4, 4)
+    max_raises: int = 2
+    stack: int = 1_000
+
+    @property
+    def n_signatures(self) -> int:
+        return N_STAGES * (self.max_raises + 1)
+
+    def signature(self, stage: int, to_call: int) -> int:
+        """What a player sees of the betting: the stage and how many raises there are to call."""
+        facing = min(-(-to_call // self.raise_sizes[stage]), self.max_raises)
+        return stage * (self.max_raises + 1) + facing
+
+
+@dataclass
+class BettingTree:
+    """Every betting sequence of an abstraction as arrays indexed by node, the root is node 0.
+    Decision nodes are numbered separately, so that the regret and strategy tables have
+    a row per decision node and bucket.
+    """
+    kind: np.ndarray  # DECISION, FOLD_END or SHOWDOWN
+    player: np.ndarray  # seat to act, -1 at the ends
+    stage: np.ndarray
+    children: np.ndarray  # (n_nodes, N_ACTIONS), -1 for illegal actions
+    decision: np.ndarray  # row of a decision node in the tables, -1 at the ends
+    signature: np.ndarray  # of every decision row
+    contributions: np.ndarray  # (n_nodes, n_players) chips put into the bank
+    live: np.ndarray  # (n_nodes, n_players) seats which haven't folded
+
+    @property
+    def n_decisions(self) -> int:
+        return len(self.signature)
+
+    @property
+    def legal(self) -> np.ndarray:
+        """Mask of the legal actions of every decision row."""
+        return self.children[self.kind == DECISION] >= 0
+
+
+@lru_cache(maxsize=None)
+def build_tree(abstraction: Abstraction) -> BettingTree:
+    """Walk every betting sequence with TableState, so that the tree follows the rules of Round."""
+    kind, player, stage_of, children, decision, signature, contributions, live = [], [], [], [], [], [], [], []
+
+    def add(table: TableState, stage: int, n_raises: int) -> int:
+        while table.n_live > 1 and table.stage_over() and stage < N_STAGES - 1:
+            table = copy.deepcopy(table)
+            table.start_stage()
+            stage, n_raises = stage + 1, 0
+        node = len(kind)
+        kind.append(FOLD_END if table.n_live == 1 else SHOWDOWN if table.stage_over() else DECISION)
+        player.append(table.active if kind[node] == DECISION else -1)
+        stage_of.append(stage)
+        children.append([-1] * N_ACTIONS)
+        decision.append(-1)
+        contributions.append(list(table.pots.contributions))
+        live.append(table.live.tolist())
+        if kind[node] != DECISION:
+            return node
+        to_call = table.to_call(table.active)
+        decision[node] = len(signature)
+        signature.append(abstraction.signature(stage, to_call))
+        if to_call:
+            child = copy.deepcopy(table)
+            child.fold()
+            children[node][FOLD] = add(child, stage, n_raises)
+        child = copy.deepcopy(table)
+        child.bet(to_call)
+        children[node][CALL] = add(child, stage, n_raises)
+        if n_raises < abstraction.max_raises:
+            child = copy.deepcopy(table)
+            child.bet(to_call + abstraction.raise_sizes[stage])
+            children[node][RAISE] = add(child, stage, n_raises + 1)
+        return node
+
+    table = TableState([abstraction.stack] * abstraction.n_players)
+    table.bet(abstraction.small_blind)
+    table.bet(abstraction.big_blind)
+    add(table, 0, 0)
+    return BettingTree(kind=np.array(kind), player=np.array(player), stage=np.array(stage_of),
+                       children=np.array(children), decision=np.array(decision), signature=np.array(signature),
+                       contributions=np.array(contributions, dtype=np.float64), live=np.array(live))
+
+
+def deal(n_deals: int, n_players: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Hole cards of shape (n_deals, n_players, 2) and boards of shape (n_deals, 5)."""
+    n_cards = N_HOLE_CARDS * n_players + N_COMMUNITY_CARDS
+    cards = np.argsort(rng.random((n_deals, N_CARDS)), axis=1)[:, :n_cards]
+    return cards[:, :N_HOLE_CARDS * n_players].reshape(n_deals, n_players, N_HOLE_CARDS), cards[:, -N_COMMUNITY_CARDS:]
+
+
+def stage_buckets(abstraction: Abstraction, hole_cards: np.ndarray, boards: np.ndarray, stage: int,
+                  rng: np.random.Generator, n_samples: int = DEFAULT_STRENGTH_SAMPLES) -> np.ndarray:
+    """Bucket of every hand at a stage: the strength against the opponents of the abstraction,
+    see ThresholdPolicy.strength, split into equal intervals.
+    """
+    n_opponents = np.full(len(hole_cards), abstraction.n_players - 1)
+    if stage == 0:
+        strength = preflop_strength(hole_cards, n_opponents)
+    else:
+        strength = postflop_strength(hole_cards, boards[:, :STAGE_COMMUNITY_CARDS[stage]], n_opponents,
+                                     rng, n_samples)
+    return np.minimum((strength * abstraction.n_buckets).astype(np.int64), abstraction.n_buckets - 1)
+
+
+def bucket_hands(abstraction: Abstraction, hole_cards: np.ndarray, boards: np.ndarray,
+                 rng: np.random.Generator) -> np.ndarray:
+    """Bucket of every hand of the deals at every stage, shape (n_deals, n_players, N_STAGES)."""
+    n_deals, n_players = hole_cards.shape[:2]
+    hole = hole_cards.reshape(-1, N_HOLE_CARDS)
+    boards = np.repeat(boards, n_players, axis=0)
+    buckets = np.stack([stage_buckets(abstraction, hole, boards, stage, rng) for stage in range(N_STAGES)], axis=1)
+    return buckets.reshape(n_deals, n_players, N_STAGES)
+
+
+def hand_values(hole_cards: np.ndarray, boards: np.ndarray) -> np.ndarray:
+    """Value of the hand of every player at the showdown, shape (n_deals, n_players)."""
+    n_deals, n_players = hole_cards.shape[:2]
+    boards = np.broadcast_to(boards[:, None, :], (n_deals, n_players, N_COMMUNITY_CARDS))
+    values, _ = evaluate_batch(np.concatenate([hole_cards, boards], axis=2).reshape(n_deals * n_players, -1))
+    return values.reshape(n_deals, n_players)
+
+
+def regret_matching(regrets: np.ndarray, legal: np.ndarray) -> np.ndarray:
+    """Strategy proportional to the positive regrets, uniform over the legal actions if there are none.
+    Works on the last axis of any number of rows.
+    """
+    positive = np.where(legal, np.maximum(regrets, 0), 0)
+    total = positive.sum(axis=-1, keepdims=True)
+    uniform = legal / legal.sum(axis=-1, keepdims=True)
+    return np.where(total > 0, positive / np.where(total > 0, total, 1), uniform)
+
+
+def average_strategy(strategy_sums: np.ndarray, legal: np.ndarray) -> np.ndarray:
+    """Normalized strategy sums, uniform over the legal actions where nothing has been accumulated."""
+    legal = np.broadcast_to(legal[:, None, :], strategy_sums.shape)
+    total = strategy_sums.sum(axis=-1, keepdims=True)
+    uniform = legal / legal.sum(axis=-1, keepdims=True)
+    return np.where(total > 0, strategy_sums / np.where(total > 0, total, 1), uniform)
+
+
+def _utility(tree: BettingTree, node: int, values: np.ndarray) -> np.ndarray:
+    """Chips won by every player at an end of the tree, values of the hands are given per deal."""
+    contributions, live = tree.contributions[node], tree.live[node]
+    pot = contributions.sum()
+    if tree.kind[node] == FOLD_END:
+        return np.broadcast_to(live * pot - contributions, values.shape)
+    values = np.where(live, values, -1)
+    winners = values == values.max(axis=-1, keepdims=True)
+    return winners * (pot / winners.sum(axis=-1, keepdims=True)) - contributions
+
+
+def run_iterations(abstraction: Abstraction, regrets: np.ndarray, n_iterations: int,
+                   seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """External-sampling MCCFR: for every sampled deal each player in turn traverses the tree exploring
+    all of their own actions and sampling the others' from the current strategy.
+    Runs inside worker processes on a snapshot of the regrets, returns the updates of the regrets
+    and of the strategy sums.
+    """
+    tree = build_tree(abstraction)
+    rng = np.random.default_rng(seed)
+    hole_cards, boards = deal(n_iterations, abstraction.n_players, rng)
+    buckets = bucket_hands(abstraction, hole_cards, boards, rng).tolist()
+    values = hand_values(hole_cards, boards)
+    regrets = regrets.copy()
+    regret_updates = np.zeros_like(regrets)
+    strategy_sums = np.zeros_like(regrets)
+    legal = tree.legal.tolist()
+    kinds, players, stages = tree.kind.tolist(), tree.player.tolist(), tree.stage.tolist()
+    children, decisions = tree.children.tolist(), tree.decision.tolist()
+    ends = np.flatnonzero(tree.kind != DECISION)
+    utilities = dict(zip(ends.tolist(), np.stack([_utility(tree, node, values) for node in ends]).tolist()))
+
+    def traverse(node: int, traverser: int, deal_idx: int) -> float:
+        if kinds[node] != DECISION:
+            return utilities[node][deal_idx][traverser]
+        row, player = decisions[node], players[node]
+        bucket = buckets[deal_idx][player][stages[node]]
+        positive = [max(regret, 0.0) if is_legal else 0.0
+                    for regret, is_legal in zip(regrets[row, bucket].tolist(), legal[row])]
+        total = sum(positive)
+        strategy = ([p / total for p in positive] if total > 0
+                    else [is_legal / sum(legal[row]) for is_legal in legal[row]])
+        if player != traverser:
+            strategy_sums[row, bucket] += strategy
+            draw, action = rng.random(), N_ACTIONS - 1
+            for candidate, probability in enumerate(strategy):
+                if draw < probability:
+                    action = candidate
+                    break
+                draw -= probability
+            while children[node][action] < 0:  # rounding at the end of the cumulative sum
+                action -= 1
+            return traverse(children[node][action], traverser, deal_idx)
+        action_values = [traverse(child, traverser, deal_idx) if child >= 0 else 0.0 for child in children[node]]
+        value = sum(p * v for p, v in zip(strategy, action_values))
+        update = [v - value if is_legal else 0.0 for v, is_legal in zip(action_values, legal[row])]
+        regrets[row, bucket] += update
+        regret_updates[row, bucket] += update
+        return value
+
+    for deal_idx in range(n_iterations):
+        for traverser in range(abstraction.n_players):
+            traverse(0, traverser, deal_idx)
+    return regret_updates, strategy_sums
+
+
+def nash_conv(abstraction: Abstraction, strategy: np.ndarray, n_deals: int = DEFAULT_EVALUATION_DEALS,
+              seed: int = 0) -> float:
+    """How much the players together would win by switching to their best responses, in chips per hand.
+    This is a sampled approximation: the best responses are computed over a fixed sample of deals and
+    can only tell the hands apart by their buckets, which forget the buckets of the earlier stages.
+    It tracks the progress of the training but is not a bound on the exploitability in the real game.
+    """
+    tree = build_tree(abstraction)
+    rng = np.random.default_rng(seed)
+    hole_cards, boards = deal(n_deals, abstraction.n_players, rng)
+    buckets = bucket_hands(abstraction, hole_cards, boards, rng)
+    values = hand_values(hole_cards, boards)
+    deals = np.arange(n_deals)
+
+    def policy_at(node: int) -> np.ndarray:
+        return strategy[tree.decision[node], buckets[deals, tree.player[node], tree.stage[node]]]
+
+    def expected(node: int) -> np.ndarray:
+        """Chips won by every player when everybody follows the strategy, shape (n_deals, n_players)."""
+        if tree.kind[node] != DECISION:
+            return _utility(tree, node, values)
+        probabilities = policy_at(node)
+        return sum(probabilities[:, [action]] * expected(child)
+                   for action, child in enumerate(tree.children[node]) if child >= 0)
+
+    def best_response(node: int, responder: int, reach: np.ndarray) -> np.ndarray:
+        """Chips won by the responder per deal, `reach` is the probability of the others' actions."""
+        if tree.kind[node] != DECISION:
+            return _utility(tree, node, values)[:, responder]
+        actions = [(action, child) for action, child in enumerate(tree.children[node]) if child >= 0]
+        if tree.player[node] != responder:
+            probabilities = policy_at(node)
+            return sum(probabilities[:, action] * best_response(child, responder, reach * probabilities[:, action])
+                       for action, child in actions)
+        action_values = np.stack([best_response(child, responder, reach) for _, child in actions])
+        bucket = buckets[:, responder, tree.stage[node]]
+        scores = np.stack([np.bincount(bucket, weights=reach * v, minlength=abstraction.n_buckets)
+                           for v in action_values])
+        return action_values[scores.argmax(axis=0)[bucket], deals]
+
+    on_policy = expected(0).mean(axis=0)
+    gains = [best_response(0, responder, np.ones(n_deals)).mean() - on_policy[responder]
+             for responder in range(abstraction.n_players)]
+    return float(sum(gains))
+
+
+def train(abstraction: Abstraction, n_iterations: int, n_workers: int = 1, executor: Optional[Executor] = None,
+          iterations_per_task: int = DEFAULT_ITERATIONS_PER_TASK, seed: int = 0,
+          evaluate_every: Optional[int] = None) -> Iterator[dict]:
+    """Run MCCFR iterations in tasks of `iterations_per_task` spread over processes, every wave of tasks
+    starting from the same regrets, and yield the progress after every wave and at the end.
+    The last progress contains the tables under 'regrets' and 'strategy_sums'.
+    """
+    if n_iterations < 1 or iterations_per_task < 1:
+        raise ValueError(f'Training needs at least one iteration and one iteration per task, '
+                         f'got {n_iterations} and {iterations_per_task}.')
+    tree = build_tree(abstraction)
+    shape = (tree.n_decisions, abstraction.n_buckets, N_ACTIONS)
+    regrets, strategy_sums = np.zeros(shape), np.zeros(shape)
+    own_executor = executor is None and n_workers > 1
+    if own_executor:
+        from concurrent.futures import ProcessPoolExecutor  # spares the single process callers its imports
+        executor = ProcessPoolExecutor(max_workers=n_workers)
+    evaluate_every = evaluate_every or n_workers * iterations_per_task
+    training_time, done, task_idx, next_evaluation = 0.0, 0, 0, evaluate_every
+    try:
+        while done < n_iterations:
+            start = time.perf_counter()
+            wave = []
+            for _ in range(max(n_workers, 1)):
+                size = min(iterations_per_task, n_iterations - done - sum(s for s, _ in wave))
+                if size <= 0:
+                    break
+                args = (abstraction, regrets, size, int(np.random.SeedSequence(seed, spawn_key=(task_idx,))
+                                                         .generate_state(1)[0]))
+                wave.append((size, executor.submit(run_iterations, *args) if executor else run_iterations(*args)))
+                task_idx += 1
+            for size, task in wave:
+                regret_updates, strategy_updates = task.result() if executor else task
+                regrets += regret_updates
+                strategy_sums += strategy_updates
+                done += size
+            training_time += time.perf_counter() - start  # without the time of the evaluations
+            progress = {'iterations': done, 'iterations_per_second': done / training_time}
+            if done >= next_evaluation or done >= n_iterations:
+                progress['nash_conv'] = nash_conv(abstraction, average_strategy(strategy_sums, tree.legal))
+                next_evaluation += evaluate_every
+            yield progress
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    yield {**progress, 'regrets': regrets, 'strategy_sums': strategy_sums}
+
+
+def signature_strategy(abstraction: Abstraction, strategy_sums: np.ndarray) -> np.ndarray:
+    """Strategy by what a player sees, shape (n_signatures, n_buckets, N_ACTIONS): the strategies of
+    the decision nodes sharing a signature averaged with the weights of how often they were reached.
+    """
+    tree = build_tree(abstraction)
+    sums = np.zeros((abstraction.n_signatures, abstraction.n_buckets, N_ACTIONS))
+    np.add.at(sums, tree.signature, strategy_sums)
+    legal = np.zeros((abstraction.n_signatures, N_ACTIONS), dtype=bool)
+    np.logical_or.at(legal, tree.signature, tree.legal)
+    legal[~legal.any(axis=1)] = True  # signatures which never occur
+    return average_strategy(sums, legal)
+
+
+def save_strategy(directory: pathlib.Path, abstraction: Abstraction, strategy_sums: np.ndarray):
+    """Write the abstraction, the average strategy of the tree and the strategy by signature,
+    which CFRPolicy memory-maps on load.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    tree = build_tree(abstraction)
+    np.save(directory / 'strategy.npy', average_strategy(strategy_sums, tree.legal).astype(np.float32))
+    np.save(directory / 'signature_strategy.npy',
+            signature_strategy(abstraction, strategy_sums).astype(np.float32))
+    (directory / 'abstraction.json').write_text(json.dumps(asdict(abstraction)))
+
+
+def load_strategy(directory: pathlib.Path = CFR_DIR) -> tuple[Abstraction, np.ndarray]:
+    """The abstraction and the memory-mapped strategy by signature."""
+    config = json.loads((directory / 'abstraction.json').read_text())
+    abstraction = Abstraction(**{**config, 'raise_sizes': tuple(config['raise_sizes'])})
+    return abstraction, np.load(directory / 'signature_strategy.npy', mmap_mode='r')
+
+
+class CFRPolicy:
+    """Plays a trained strategy: looks up the probabilities of the abstract actions by the stage,
+    the raises to call and the bucket of the hand, and samples one of them.
+    Like ThresholdPolicy it can be a Player.policy or decide for many rows with `batch`.
+    """
+
+    def __init__(self, directory: pathlib.Path = CFR_DIR, rng: Optional[np.random.Generator] = None):
+        self.abstraction, self.strategy = load_strategy(directory)
+        self.rng = np.random.default_rng() if rng is None else rng
+
+    def __call__(self, player, community_cards, n_opponents, to_call, pot):
+        observation = Observation.of_player(player, community_cards, n_opponents, to_call, pot)
+        return int(self.batch(observation)[0])
+
+    def batch(self, observation) -> np.ndarray:
+        """Bets of all the rows of an observation, -1 to fold."""
+        abstraction = self.abstraction
+        stage_idx, to_call = observation.stage_idx, observation.to_call
+        n = len(stage_idx)
+        # the hands are bucketed against the number of opponents of the abstraction, which the strategy expects
+        buckets = np.empty(n, dtype=np.int64)
+        for stage in np.unique(stage_idx).tolist():
+            rows = np.flatnonzero(stage_idx == stage)
+            buckets[rows] = stage_buckets(abstraction, observation.hole_cards[rows],
+                                          observation.community_cards[rows], stage, self.rng)
+        raise_sizes = np.asarray(abstraction.raise_sizes)[stage_idx]
+        facing = np.minimum(-(-to_call // raise_sizes), abstraction.max_raises)
+        signatures = stage_idx * (abstraction.max_raises + 1) + facing
+        probabilities = np.asarray(self.strategy[signatures, buckets], dtype=np.float64)
+        draws = self.rng.random(n)[:, None]
+        actions = np.minimum((draws > probabilities.cumsum(axis=1)).sum(axis=1), N_ACTIONS - 1)
+        bets = np.where(actions == RAISE, to_call + raise_sizes, to_call)
+        return np.where((actions == FOLD) & (to_call > 0), -1, bets)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train a strategy with MCCFR and report the progress as JSON lines.')
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--buckets', type=int, default=8)
+    parser.add_argument('--max-raises', type=int, default=2)
+    parser.add_argument('--iterations', type=int, default=10_000)
+    parser.add_argument('--iterations-per-task', type=int, default=DEFAULT_ITERATIONS_PER_TASK)
+    parser.add_argument('--evaluate-every', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=pathlib.Path, default=CFR_DIR)
+    args = parser.parse_args()
+
+    trained_abstraction = Abstraction(n_players=args.players, n_buckets=args.buckets, max_raises=args.max_raises)
+    for report in train(trained_abstraction, args.iterations, n_workers=args.workers,
+                        iterations_per_task=args.iterations_per_task, seed=args.seed,
+                        evaluate_every=args.evaluate_every):
+        if 'strategy_sums' in report:
+            save_strategy(args.output, trained_abstraction, report['strategy_sums'])
+        else:
+            print(json.dumps(report), flush=True)
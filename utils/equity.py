@@ -0,0 +1,306 @@
+import time
+from collections import Counter
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from itertools import combinations, permutations
+from math import comb, factorial, prod
+from statistics import NormalDist
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from utils.ai import evaluate_batch, evaluate_cards
+from utils.cards import Deck, PlayingCard, N_CARDS, SUITS
+
+
+N_COMMUNITY_CARDS = 5
+N_HOLE_CARDS = 2
+DEFAULT_N_SAMPLES = 10_000
+DEFAULT_BATCH_SIZE = 2_000
+DEFAULT_MAX_EXACT_WORK = 500_000
+STAGE_COMMUNITY_CARDS = (0, 3, 4, 5)  # number of cards on the table at every Round.stage_idx
+SUIT_PERMUTATIONS = tuple(permutations(range(len(SUITS))))
+
+Cards = Sequence[Union[PlayingCard, int]]
+
+
+@dataclass(frozen=True)
+class EquityResult:
+    """Outcome of an equity calculation from the point of view of a single hand.
+
+    Attributes
+    ----------
+    win : float
+        Share of the runouts in which the hand wins alone.
+    tie : float
+        Share of the runouts in which the hand splits the pot.
+    loss : float
+        Share of the runouts in which the hand loses.
+    equity : float
+        Expected share of the pot, ties being split between the tied hands.
+    n_samples : int
+        Number of evaluated runouts.
+    confidence_interval : tuple[float, float]
+        Bounds of the confidence interval of the equity. Exact calculations have zero width.
+    """
+    win: float
+    tie: float
+    loss: float
+    equity: float
+    n_samples: int
+    confidence_interval: tuple[float, float]
+
+    @property
+    def interval_width(self) -> float:
+        return self.confidence_interval[1] - self.confidence_interval[0]
+
+
+def to_card_ints(cards: Cards) -> list[int]:
+    """Integer representation of cards given either as playing cards or integers."""
+    return [card.index if isinstance(card, PlayingCard) else int(card) for card in cards]
+
+
+def unseen_cards(known_cards: Sequence[int]) -> np.ndarray:
+    """Sorted cards of the deck which are neither in hand nor on the board."""
+    deck = Deck(shuffled=False)
+    deck.remove(known_cards)
+    return np.sort(deck.remaining_indices())
+
+
+def showdown_outcomes(hero_values: np.ndarray, opponents_values: np.ndarray) -> np.ndarray:
+    """Tally the runouts of a hand against its opponents.
+
+    Parameters
+    ----------
+    hero_values : np.ndarray
+        Array of shape (N,) with the hand values of the hero.
+    opponents_values : np.ndarray
+        Array of shape (N, n_opponents) with the hand values of the opponents.
+
+    Returns
+    -------
+    np.ndarray
+        Sums of wins, ties, losses, equity and squared equity over the runouts.
+    """
+    best_opponent = opponents_values.max(axis=1)
+    n_tied = (opponents_values == hero_values[:, None]).sum(axis=1)
+    return tally_outcomes(hero_values, best_opponent, n_tied)
+
+
+def tally_outcomes(hero_values: np.ndarray, best_opponent: np.ndarray, n_tied: np.ndarray,
+                   weight: int = 1) -> np.ndarray:
+    """Sums of `showdown_outcomes` given the best opponent's value and the number of opponents
+    having the same value as the hero in every runout. Every runout is counted `weight` times.
+    """
+    wins = hero_values > best_opponent
+    ties = hero_values == best_opponent
+    equity = np.where(wins, 1.0, np.where(ties, 1 / (n_tied + 1), 0.0))
+    n_runouts = np.broadcast(hero_values, best_opponent).size
+    return weight * np.array([wins.sum(), ties.sum(), n_runouts - wins.sum() - ties.sum(),
+                              equity.sum(), (equity ** 2).sum()], dtype=np.float64)
+
+
+def simulate_batch(hole_cards: Sequence[int], community_cards: Sequence[int], n_opponents: int,
+                   n_samples: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Play out random runouts against random opponents' hands. Runs inside worker processes.
+    Returns the same sums as `showdown_outcomes`.
+    """
+    rng = np.random.default_rng(seed)
+    deck = unseen_cards(list(hole_cards) + list(community_cards))
+    n_missing = N_COMMUNITY_CARDS - len(community_cards)
+    n_needed = n_missing + N_HOLE_CARDS * n_opponents
+    # partial Fisher-Yates shuffle of every row, only as far as the number of needed cards
+    drawn = np.tile(deck, (n_samples, 1))
+    rows = np.arange(n_samples)
+    swaps = rng.integers(np.arange(n_needed), len(deck), size=(n_samples, n_needed))
+    for i in range(n_needed):
+        swapped = drawn[rows, swaps[:, i]]
+        drawn[rows, swaps[:, i]] = drawn[:, i]
+        drawn[:, i] = swapped
+    drawn = drawn[:, :n_needed]
+
+    boards = np.hstack([np.broadcast_to(np.asarray(community_cards, dtype=np.int64),
+                                        (n_samples, len(community_cards))), drawn[:, :n_missing]])
+    hero_values, _ = evaluate_batch(np.hstack([np.broadcast_to(hole_cards, (n_samples, N_HOLE_CARDS)), boards]))
+    opponents_holes = drawn[:, n_missing:].reshape(n_samples, n_opponents, N_HOLE_CARDS)
+    opponents_boards = np.broadcast_to(boards[:, None, :], (n_samples, n_opponents, N_COMMUNITY_CARDS))
+    opponents_cards = np.concatenate([opponents_holes, opponents_boards], axis=2)
+    opponents_values, _ = evaluate_batch(opponents_cards.reshape(-1, N_HOLE_CARDS + N_COMMUNITY_CARDS))
+    return showdown_outcomes(hero_values, opponents_values.reshape(n_samples, n_opponents))
+
+
+def summarize_outcomes(totals: np.ndarray, confidence: float = 0.95) -> EquityResult:
+    """Turn the sums of `showdown_outcomes` into an equity result with a normal confidence interval."""
+    wins, ties, losses, equity_sum, equity_sq_sum = totals.tolist()
+    n_samples = int(wins + ties + losses)
+    equity = equity_sum / n_samples
+    variance = max(equity_sq_sum / n_samples - equity ** 2, 0.0)
+    half_width = NormalDist().inv_cdf((1 + confidence) / 2) * (variance / n_samples) ** 0.5
+    return EquityResult(win=wins / n_samples, tie=ties / n_samples, loss=losses / n_samples,
+                        equity=equity, n_samples=n_samples,
+                        confidence_interval=(max(equity - half_width, 0.0), min(equity + half_width, 1.0)))
+
+
+def monte_carlo_equity(hole_cards: Cards, community_cards: Cards = (), n_opponents: int = 1,
+                       n_samples: Optional[int] = None, time_budget: Optional[float] = None,
+                       tolerance: Optional[float] = None, confidence: float = 0.95,
+                       n_workers: int = 1, executor: Optional[Executor] = None,
+                       seed: int = 0, batch_size: int = DEFAULT_BATCH_SIZE) -> EquityResult:
+    """Estimate the equity of hole cards against random hands of n_opponents by sampling runouts.
+
+    Samples are drawn in batches, each batch seeded from `seed` and its own number, so that
+    without a time budget the result doesn't depend on the number of workers.
+
+    Parameters
+    ----------
+    hole_cards : Cards
+        The two cards of the player.
+    community_cards : Cards
+        Cards already on the table, from none up to five.
+    n_opponents : int
+        Number of opponents holding random cards.
+    n_samples : Optional[int]
+        Maximum number of runouts. Defaults to DEFAULT_N_SAMPLES unless a time budget is given.
+    time_budget : Optional[float]
+        Maximum number of seconds to spend on sampling.
+    tolerance : Optional[float]
+        Stop early once the width of the confidence interval is below this value.
+    confidence : float
+        Confidence level of the reported interval.
+    n_workers : int
+        Number of processes to split the batches across. 1 means sampling in the current process.
+    executor : Optional[Executor]
+        Already running executor to be used instead of starting a new process pool.
+    seed : int
+        Root seed of the batches.
+    batch_size : int
+        Number of runouts in a single batch.
+    """
+    hole_cards, community_cards = to_card_ints(hole_cards), to_card_ints(community_cards)
+    n_unseen = len(unseen_cards(hole_cards + community_cards))
+    if N_COMMUNITY_CARDS - len(community_cards) + N_HOLE_CARDS * n_opponents > n_unseen:
+        raise ValueError('There are less cards in the deck than the opponents and the board need.')
+    if n_samples is None and time_budget is None:
+        n_samples = DEFAULT_N_SAMPLES
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+    own_executor = executor is None and n_workers > 1
+    if own_executor:
+        from concurrent.futures import ProcessPoolExecutor  # spares the single process callers its imports
+        executor = ProcessPoolExecutor(max_workers=n_workers)
+    totals = np.zeros(5)
+    batch_idx = 0
+    try:
+        while True:
+            wave = []
+            for _ in range(n_workers):  # one batch per worker in every wave
+                size = batch_size if n_samples is None else min(batch_size, n_samples - batch_idx * batch_size)
+                if size <= 0:
+                    break
+                batch_seed = np.random.SeedSequence(seed, spawn_key=(batch_idx,))
+                args = (hole_cards, community_cards, n_opponents, size, batch_seed)
+                wave.append(executor.submit(simulate_batch, *args) if executor else simulate_batch(*args))
+                batch_idx += 1
+            if not wave:
+                break
+            # batches are accumulated in order so that the stopping point is the same for any n_workers
+            for batch in wave:
+                totals += batch.result() if executor else batch
+                if tolerance is not None and summarize_outcomes(totals, confidence).interval_width < tolerance:
+                    return summarize_outcomes(totals, confidence)
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    return summarize_outcomes(totals, confidence)
+
+
+def permute_suits(cards: Sequence[int], permutation: Sequence[int]) -> tuple[int, ...]:
+    """Cards with their suits swapped according to a permutation of suits."""
+    return tuple(card & ~3 | permutation[card & 3] for card in cards)
+
+
+def canonical_runouts(known_cards: Sequence[int], deck: Sequence[int], n_cards: int) -> Counter:
+    """All the ways to deal n_cards from the deck, with suit-isomorphic deals collapsed into one.
+
+    Two deals are isomorphic if a permutation of suits which leaves the known cards as they are
+    turns one into another, they then have the same equity. Returns a counter of the canonical
+    deals with the number of deals every one of them stands for.
+    """
+    known_set = set(known_cards)
+    stabilizer = [p for p in SUIT_PERMUTATIONS if set(permute_suits(known_cards, p)) == known_set]
+    runouts = Counter()
+    for runout in combinations(deck, n_cards):
+        runouts[min(tuple(sorted(permute_suits(runout, p))) for p in stabilizer)] += 1
+    return runouts
+
+
+def exact_work_estimate(stage_idx: int, n_opponents: int) -> int:
+    """Number of hand combinations which exact enumeration has to go through at a given stage."""
+    n_unseen = N_CARDS - N_HOLE_CARDS - STAGE_COMMUNITY_CARDS[stage_idx]
+    n_missing = N_COMMUNITY_CARDS - STAGE_COMMUNITY_CARDS[stage_idx]
+    n_left = n_unseen - n_missing
+    n_holdings = prod(comb(n_left - N_HOLE_CARDS * i, N_HOLE_CARDS) for i in range(n_opponents))
+    return comb(n_unseen, n_missing) * n_holdings // factorial(n_opponents)
+
+
+def _enumerate_opponents(hero_value: int, values: np.ndarray, masks: np.ndarray, n_opponents: int,
+                         weight: int, start: int = 0, used: int = 0,
+                         best: int = -1, n_tied: int = 0) -> np.ndarray:
+    """Tally every set of n_opponents disjoint holdings out of the given ones.
+    Holdings are taken in increasing order so that each set is met once; the last opponent is vectorized.
+    """
+    if n_opponents == 1:
+        free = (masks[start:] & used) == 0
+        last_values = values[start:][free]
+        return tally_outcomes(hero_value, np.maximum(last_values, best),
+                              n_tied + (last_values == hero_value), weight)
+    totals = np.zeros(5)
+    for i in range(start, len(values)):
+        if masks[i] & used:
+            continue
+        value = int(values[i])
+        totals += _enumerate_opponents(hero_value, values, masks, n_opponents - 1, weight, i + 1,
+                                       used | int(masks[i]), max(best, value), n_tied + (value == hero_value))
+    return totals
+
+
+def exact_equity(hole_cards: Cards, community_cards: Cards = (), n_opponents: int = 1) -> EquityResult:
+    """Equity of hole cards against n_opponents calculated by going through every runout
+    and every combination of the opponents' hole cards.
+    Meant for the flop, turn and river, when few cards are left to come.
+    """
+    hole_cards, community_cards = to_card_ints(hole_cards), to_card_ints(community_cards)
+    known_cards = hole_cards + community_cards
+    deck = unseen_cards(known_cards)
+    first, second = np.triu_indices(len(deck) - N_COMMUNITY_CARDS + len(community_cards), k=1)
+
+    runouts = canonical_runouts(known_cards, deck.tolist(), N_COMMUNITY_CARDS - len(community_cards))
+    totals = np.zeros(5)
+    for runout, weight in runouts.items():
+        board = community_cards + list(runout)
+        left = np.setdiff1d(deck, runout)
+        holdings = np.stack([left[first], left[second]], axis=1)
+        values, _ = evaluate_batch(np.hstack([holdings, np.broadcast_to(board, (len(holdings), len(board)))]))
+        hero_value = evaluate_cards(hole_cards + board)
+        masks = (np.int64(1) << holdings[:, 0]) | (np.int64(1) << holdings[:, 1])
+        totals += _enumerate_opponents(hero_value, values, masks, n_opponents, weight)
+
+    wins, ties, losses, equity_sum, _ = totals.tolist()
+    n_combinations = int(wins + ties + losses)
+    equity = equity_sum / n_combinations
+    return EquityResult(win=wins / n_combinations, tie=ties / n_combinations, loss=losses / n_combinations,
+                        equity=equity, n_samples=n_combinations, confidence_interval=(equity, equity))
+
+
+def calculate_equity(hole_cards: Cards, community_cards: Cards = (), n_opponents: int = 1,
+                     max_exact_work: int = DEFAULT_MAX_EXACT_WORK, **kwargs) -> EquityResult:
+    """Equity of hole cards against n_opponents, enumerated exactly if the stage of the round
+    leaves little enough work for it, otherwise estimated by Monte Carlo sampling.
+    Keyword arguments are passed to `monte_carlo_equity`.
+    """
+    stage_idx = STAGE_COMMUNITY_CARDS.index(len(community_cards))
+    if exact_work_estimate(stage_idx, n_opponents) <= max_exact_work:
+        return exact_equity(hole_cards, community_cards, n_opponents)
+    return monte_carlo_equity(hole_cards, community_cards, n_opponents, **kwargs)
@@ -1,9 +1,22 @@
 from typing import Optional
 import random
 from collections import deque
+from dataclasses import dataclass
 
+import numpy as np
+
+from utils.ai import evaluate_batch
+from utils.board_cache import BoardCache
 from utils.cards import Deck
+from utils.history import Event, HandHistoryWriter
+from utils.instrument import instrumented
+from utils.opponents import Action, OpponentStats
 from utils.player import Player
+from utils.policies import ThresholdPolicy, behavior_policies
+from utils.table_state import TableState
+
+
+DECK_SEED_BITS = 63  # seeds fit into the signed amounts of the hand history
 
 
 class Game:
@@ -16,10 +29,24 @@ class Game:
     players : Optional[deque[Player]]
         List of players. Takes precedence over n_players if provided.
         If not provided then generated based on n_players
+    stats : OpponentStats
+        Statistics of the actions of the players, kept across the rounds.
+    history : Optional[HandHistoryWriter]
+        Log every round is recorded into.
+    rng : random.Random
+        Source of the choice of the dealer and of the seeds of the decks of the rounds,
+        a fresh generator by default. Seeding it makes the whole game reproducible.
+    policy_rng : np.random.Generator
+        Generator of the policies of the game, seeded from `rng`.
+    policies : dict[str, ThresholdPolicy]
+        Policies of the built-in behaviors, given to the players who have no policy of their own.
+    board_cache : Optional[BoardCache]
+        Cache the showdowns of the rounds are scored through.
     """
 
     def __init__(self, n_players=3, players=None, limits=None,
-                 small_blind=1, big_blind=2, antes=None):
+                 small_blind=1, big_blind=2, antes=None, stats=None, history=None, rng=None,
+                 board_cache=None):
         self.big_blind = big_blind
         self.antes = antes
         self.small_blind = small_blind
@@ -34,32 +61,137 @@ class Game:
 
         # pick the player who will be the first at the beginning and rotate the list
         # so that the dealer is also first
-        first_player_idx = random.choice(range(len(players)))
+        self.rng = random.Random() if rng is None else rng
+        first_player_idx = self.rng.choice(range(len(players)))
         players.rotate(-first_player_idx)
         self.players = players
+        self.policy_rng = np.random.default_rng(self.rng.getrandbits(64))
+        self.policies = behavior_policies(self.policy_rng)
+        for player in players:
+            if player.policy is None:
+                player.policy = self.policies.get(player.behavior)
 
         # the current set of players may be different from the initial one because
         # some may lose all their money and be out of the game
         self.initial_players = players.copy()
+        self.rounds_played = 0
+        self.deck = Deck(shuffled=False)  # reshuffled for every round
+        self.stats = OpponentStats() if stats is None else stats
+        self.history = history
+        self.board_cache = board_cache
+
+    @classmethod
+    def from_n_players(cls, n_players, behaviors=('Standard',), funds=200, **kwargs):
+        """Make a game of n_players with the given behaviors assigned to them in turn.
+        Keyword arguments are passed to the constructor.
+        """
+        assert n_players > 1, 'There should be at least 2 players.'
+        players = deque(Player(f'Player {i}', behaviors[i % len(behaviors)], funds) for i in range(n_players))
+        return cls(players=players, **kwargs)
 
+    @classmethod
+    def from_checkpoint(cls, checkpoint: 'GameCheckpoint', **kwargs):
+        """Restore a game saved by `checkpoint`. Keyword arguments are passed to the constructor."""
+        players = deque(Player(name, behavior, funds) for name, behavior, funds in checkpoint.players)
+        game = cls(players=players.copy(), small_blind=checkpoint.small_blind, big_blind=checkpoint.big_blind,
+                   **kwargs)
+        game.players = players  # undo the choice of the dealer
+        game.rng.setstate(checkpoint.rng_state)
+        if checkpoint.policy_rng_state is not None:
+            game.policy_rng.bit_generator.state = checkpoint.policy_rng_state
+        game.rounds_played = checkpoint.rounds_played
+        return game
+
+    def checkpoint(self) -> 'GameCheckpoint':
+        """Everything needed to go on with the game from the current state, between the rounds."""
+        return GameCheckpoint(rounds_played=self.rounds_played,
+                              players=[(p.name, p.behavior, p.funds) for p in self.players],
+                              rng_state=self.rng.getstate(),
+                              small_blind=self.small_blind,
+                              big_blind=self.big_blind,
+                              policy_rng_state=self.policy_rng.bit_generator.state)
+
+    @property
+    def is_over(self):
+        """Whether less than two players can afford the big blind."""
+        return sum(p.funds >= self.big_blind for p in self.players) < 2
+
+    @instrumented
     def play_round(self):
+        """Start a new round with the players who can still afford the big blind.
+        The dealer button moves by one seat after every round.
+        The deck of every round is shuffled with a seed drawn from the game's generator.
+        """
+        if self.rounds_played:
+            self.players.rotate(-1)
+        self.players = deque(p for p in self.players if p.funds >= self.big_blind)
         if len(self.players) > 1:
-            game_round = Round(players=self.players,
+            game_round = Round(players=self.players.copy(),
                                small_blind=self.small_blind,
-                               big_blind=self.big_blind)
+                               big_blind=self.big_blind,
+                               deck=self.deck,
+                               stats=self.stats,
+                               history=self.history,
+                               seed=self.rng.getrandbits(DECK_SEED_BITS),
+                               board_cache=self.board_cache)
+            self.rounds_played += 1
             return game_round
         else:
             print('No more opponents are left.')
 
 
+@dataclass
+class GameCheckpoint:
+    """State of a game between two rounds.
+
+    Attributes
+    ----------
+    rounds_played : int
+        Number of the rounds played before.
+    players : list[tuple[str, str, int]]
+        Name, behavior and funds of the players in the order of their seats, the dealer first.
+    rng_state : tuple
+        State of the generator of the game.
+    small_blind, big_blind : int
+        Blinds of the game.
+    policy_rng_state : Optional[dict]
+        State of the generator of the policies of the game.
+    """
+    rounds_played: int
+    players: list[tuple[str, str, int]]
+    rng_state: tuple
+    small_blind: int
+    big_blind: int
+    policy_rng_state: Optional[dict] = None
+
+
 class Round:
     """A round is a single game which consists of four stages:
     pre-flop, flop, turn and river.
 
+    The state of the table lives in a TableState indexed by seats, the round
+    translates between the seats and the players sitting at them.
+
     Attributes
     ----------
     players : deque[Player]
-        The list of players in the round.
+        The list of players still in the round, starting from the one whose turn it is.
+    seats : list[Player]
+        Players in the order of their seats, the first one posts the small blind.
+    table : TableState
+        Stacks, bets and statuses of the seats.
+    deck : Optional[Deck]
+        Deck to be reshuffled and dealt from instead of a new one.
+    stats : Optional[OpponentStats]
+        Statistics updated with every action, the players can read them through `opponent_stats`.
+    history : Optional[HandHistoryWriter]
+        Log the cards, the actions and the payouts of the round are recorded into.
+    seed : Optional[int]
+        Seed the deck is shuffled with, recorded into the history so that the round can be replayed.
+    board_cache : Optional[BoardCache]
+        Cache of the values of every hand on a board which the showdown reads the scores from,
+        worth it when the same boards come up again, e.g. in replays and analysis.
+        The hands are evaluated directly without it.
 
     Methods
     -------
@@ -69,68 +201,136 @@ class Round:
 
     def __init__(self, players: deque[Player],
                  small_blind: int = 1,
-                 big_blind: int = 2):
-        self.deck = Deck()
+                 big_blind: int = 2,
+                 deck: Optional[Deck] = None,
+                 stats: Optional[OpponentStats] = None,
+                 history: Optional[HandHistoryWriter] = None,
+                 seed: Optional[int] = None,
+                 board_cache: Optional[BoardCache] = None):
+        rng = None if seed is None else random.Random(seed)
+        if deck is None:
+            deck = Deck(rng)
+        else:
+            deck.shuffle(rng)
+        self.deck = deck
         self.community_cards = []
-        self.players = players
-        self.first_player = self.players[0]  # the one from which each post flop stage starts
+        self.seats = list(players)
+        self.seat_of = {player: seat for seat, player in enumerate(self.seats)}
+        self.table = TableState([p.funds for p in self.seats])
         self.small_blind = small_blind
         self.big_blind = big_blind
-        self.bank = 0
         self.stage_idx = 0
         self.next_action = "Player's turn"
-        self.active_players_bets = {}
         self.scores = {}
+        self.winners = []
+        self.n_actions = 0
+        self.stats = stats
+        self.board_cache = board_cache
+        for player in self.seats:
+            player.clear_cards()
+            player.opponent_stats = stats
+        if stats is not None:
+            stats.start_hand(player.name for player in self.seats)
+        self.history = history
+        if history is not None:
+            history.start_hand(self.table.stacks.tolist(), seed)
         self._do_blinds()  # place blinds to the bank
         self.deal_cards()
 
         # the current set of players may be different from the initial one because
         # some may fold
-        self.initial_players = self.players.copy()
+        self.initial_players = players.copy()
+
+    @property
+    def players(self) -> deque[Player]:
+        first_seat = self.table.active if self.table.active >= 0 else self.table.button
+        return deque(self.seats[seat] for seat in self.table.seats_from(first_seat))
+
+    @property
+    def active_player(self) -> Optional[Player]:
+        return self.seats[self.table.active] if self.table.active >= 0 else None
+
+    @property
+    def first_player(self) -> Player:
+        """The one from which each post flop stage starts."""
+        return self.seats[self.table.seats_from(self.table.button)[0]]
+
+    @property
+    def bank(self) -> int:
+        return self.table.pot
+
+    @property
+    def active_players_bets(self) -> dict[Player, int]:
+        """Bets of the current stage of the players still in the round who have acted."""
+        table = self.table
+        return {self.seats[seat]: int(table.bets[seat])
+                for seat in np.flatnonzero(table.acted & table.live).tolist()}
 
     def deal_cards(self):
         """Deal cards to the table or to the players based on the stage of the game.
         Stage is one these "pre-flop", "flop", "turn", "river" but based on an index.
         """
         if self.stage_idx == 0:
+            for seat, player in enumerate(self.seats):
+                hole_cards = self.deck.deal(num_cards=2)
+                player.receive_card(hole_cards)
+                if self.history is not None:
+                    self.history.write(Event.HOLE_CARDS, seat=seat, cards=[card.index for card in hole_cards])
+        else:
+            new_cards = self.deck.deal(num_cards=3 if self.stage_idx == 1 else 1)
+            self.community_cards.extend(new_cards)
             for player in self.players:
-                player.receive_card(self.deck.deal(num_cards=2))
-        elif self.stage_idx == 1:
-            self.community_cards.extend(self.deck.deal(num_cards=3))
-        elif self.stage_idx in (2, 3):
-            self.community_cards.extend(self.deck.deal(num_cards=1))
+                player.see_community_cards(new_cards)
+            if self.history is not None:
+                self.history.write(Event.BOARD_CARDS, self.stage_idx, cards=[card.index for card in new_cards])
+        live_seats = np.flatnonzero(self.table.live)
+        self.table.hand_values[live_seats] = [self.seats[seat].hand.value() for seat in live_seats.tolist()]
+
+    def leaderboard(self):
+        """Players still in the round ordered from the best current hand to the worst."""
+        live_seats = np.flatnonzero(self.table.live)
+        order = np.argsort(-self.table.hand_values[live_seats], kind='stable')
+        return [self.seats[seat] for seat in live_seats[order].tolist()]
 
     def _do_blinds(self):
-        """Players with blinds give their blinds, and the queue of players is rotated."""
-        self.make_single_bet(self.small_blind)
-        self.make_single_bet(self.big_blind)
+        """Players with blinds give their blinds, and the turn passes on."""
+        self.make_single_bet(self.small_blind, blind=True)
+        self.make_single_bet(self.big_blind, blind=True)
 
-    def make_single_bet(self, amount):
+    def make_single_bet(self, amount, blind=False):
         """Active player bets by giving a given amount of money to the bank.
-        The bet is recorded into active_players_bets dict.
+        The bet is recorded into the table state and the hand history.
         The turn is passed onto the next player.
         """
-        self.bank += self.players[0].do_bet(amount)
-        if self.players[0] in self.active_players_bets:
-            self.active_players_bets[self.players[0]] += amount
-        else:
-            self.active_players_bets[self.players[0]] = amount
-        self.players.rotate(-1)
+        player = self.active_player
+        seat, to_call = self.table.active, self.table.to_call(self.table.active)
+        amount = player.do_bet(self.table.bet(amount))
+        if self.history is not None:
+            event = Event.BLIND if blind else Event.FOLD + Action.classify(amount, to_call)
+            self.history.write(event, self.stage_idx, seat, amount=amount)
+
+    def amount_to_call(self, player):
+        """How much the player has to add to match the highest bet of the stage."""
+        return self.table.to_call(self.seat_of[player])
 
     def make_a_turn(self):
         """The player action and the response of the game to it. Return next player to act."""
-        current_player = self.players[0]
-        player_bet = current_player.analyze_and_act(self.community_cards)
+        current_player = self.active_player
+        to_call = self.table.to_call(self.table.active)
+        player_bet = current_player.analyze_and_act(self.community_cards, n_opponents=self.table.n_live - 1,
+                                                    to_call=to_call, pot=self.table.pot)
+        self.n_actions += 1
+        if self.stats is not None:
+            self.stats.record(current_player.name, self.stage_idx, Action.classify(player_bet, to_call),
+                              max(player_bet, 0), to_call)
 
         if player_bet == -1:  # if folded
-            if current_player in self.active_players_bets:
-                del self.active_players_bets[current_player]
-            if current_player == self.first_player:
-                self.first_player = self.players[1]  # next player becomes the first
-            self.players.popleft()
+            if self.history is not None:
+                self.history.write(Event.FOLD, self.stage_idx, self.table.active)
+            self.table.fold()
         else:  # if made a bet or checked
             self.make_single_bet(amount=player_bet)
-        return self.players[0]  # will be used to display in the table of players
+        return self.active_player  # will be used to display in the table of players
 
     def determine_next_event(self):
         """Based on the current state of the round determine what needs to be done next.
@@ -140,12 +340,10 @@ class Round:
          - proclaiming the victor;
          - start a new round of the game.
         """
-        if not self.active_players_bets:  # this happens at the beginning of flop, turn and river stages
-            self.next_action = "Player's turn"
-            return
-        all_bet_values = list(self.active_players_bets.values())
-        # if all bets are the same and all players in the round made their bets - stage is over
-        if all_bet_values.count(all_bet_values[0]) == len(all_bet_values) == len(self.players):
+        if self.winners:
+            self.next_action = "Round over"
+        elif self.table.n_live > 1 and self.table.stage_over():
+            # if all bets are the same and all players in the round made their bets - stage is over
             if self.stage_idx != 3:
                 self.next_action = "Next stage"
             else:
@@ -158,51 +356,83 @@ class Round:
         if self.next_action == "Player's turn":
             self.make_a_turn()
         elif self.next_action == "Next stage":
-            self.stage_idx += 1
-            self.active_players_bets = {}
-            current_position_of_first_player = self.players.index(self.first_player)
-            self.players.rotate(-current_position_of_first_player)
+            self.start_next_stage()
         elif self.next_action == "Opening up":
-            pass
-            # TODO: define logic here
+            self.open_up()
 
+    @property
+    def is_finished(self):
+        return bool(self.winners)
+
+    @instrumented
     def next_event(self):
         """Perform the actioned which is deemed as 'next' and determine what should happen after that."""
-        if not self.active_players_bets:  # this happens at the beginning of flop, turn and river stages
-            self.make_a_turn()
-
-        all_bet_values = list(self.active_players_bets.values())
-        if all_bet_values.count(all_bet_values[0]) == len(all_bet_values) == len(self.players):
+        if self.winners:  # the round is already over
+            return self.winners
+        if self.table.stage_over():
             # this happens if the stage is over (all players made bets or left, bets are the same)
             if self.stage_idx != 3:
-                # go to the next stage
-                self.stage_idx += 1
                 self.next_action = "Next stage"
-                self.active_players_bets = {}
-                current_position_of_first_player = self.players.index(self.first_player)
-                self.players.rotate(-current_position_of_first_player)
+                self.start_next_stage()
                 return self.stage_idx  # will be used later to change the image of the table
             else:
                 self.next_action = "Opening up"
-                # open up
-                for p in self.players:
-                    player_cards = p.show_cards()
-                    self.get_score(p, player_cards)
-                max_score = self.scores.values()
-                winners = [p for p, s in self.scores.items() if s == max_score]
+                winners = self.open_up()
                 if len(winners) > 1:
                     return winners  # TODO: in the UI use ', '.join(lst) to display winners
                 else:
                     return winners  # TODO: extract the first (single) element to display in the UI
         else:  # if it is a middle of a certain stage
             self.make_a_turn()
+            if self.table.n_live == 1:  # everybody else folded
+                return self.finish(list(self.players))
+
+    def start_next_stage(self):
+        """Go to the next stage, which starts from the first player, and deal the cards of the stage."""
+        self.stage_idx += 1
+        self.table.start_stage()
+        self.deal_cards()
 
-    def get_score(self, player, players_cards):
-        """Assign a score to the player based on his combination of cards."""
-        self.scores[player] = 1  # TODO: make some logic based on the cards
+    def open_up(self):
+        """Compare the hands of the remaining players and pay every pot to the best hands competing for it."""
+        self.get_scores()
+        turn_order = [self.seat_of[player] for player in self.scores]
+        self.table.hand_values[turn_order] = list(self.scores.values())
+        payouts = self.table.pots.award(self.table.hand_values.tolist(), self.table.live.tolist(), turn_order)
+        return self.finish([self.seats[seat] for seat in turn_order if payouts[seat]], payouts)
 
-    # TODO: provide validation of funds mechanism so that the bets can't go over
-    #  the lowest available fund of any player in the game
+    def finish(self, winners, payouts=None):
+        """Pay the given amounts to the seats, or split the bank between the winners
+        with the remainder going to the first of them.
+        """
+        if payouts is None:
+            share, remainder = divmod(self.bank, len(winners))
+            payouts = [0] * len(self.seats)
+            for winner in winners:
+                payouts[self.seat_of[winner]] += share
+            payouts[self.seat_of[winners[0]]] += remainder
+        for seat, payout in enumerate(payouts):
+            self.seats[seat].funds += payout
+            self.table.stacks[seat] += payout
+            if payout and self.history is not None:
+                self.history.write(Event.PAYOUT, self.stage_idx, seat, amount=payout)
+        self.table.pot = 0
+        self.winners = winners
+        self.next_action = "Round over"
+        return winners
+
+    def get_scores(self):
+        """Assign a score to every remaining player based on his combination of cards.
+        All hands are evaluated in a single batch, a greater score is a stronger hand.
+        """
+        players = self.players
+        if self.board_cache is not None:
+            hole_cards = np.array([[card.index for card in p.cards] for p in players])
+            scores = self.board_cache.hand_values(hole_cards, self.community_cards)
+        else:
+            all_cards = np.array([[card.index for card in p.cards + self.community_cards] for p in players])
+            scores, _ = evaluate_batch(all_cards)
+        self.scores = dict(zip(players, scores.tolist()))
 
 
 class Limit:
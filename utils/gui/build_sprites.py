@@ -0,0 +1,61 @@
+import argparse
+import json
+import pathlib
+
+from PIL import Image
+
+from utils.cards import CARDS
+from utils.gui.image_workers import (BACK_PLAYING_CARD, CARD_BORDER, SPRITES_DIR, TABLE_CARDS_REDUCTION,
+                                     YOUR_CARDS_REDUCTION, card_image_path, render_card_image, sprite_key)
+
+
+SHEET_NAME = 'sprites.png'
+SHEET_COLUMNS = 14
+
+
+def sprite_variants() -> list[tuple[pathlib.Path, int, int]]:
+    """Every card image at every border and reduction that the drawing functions use."""
+    faces = [card_image_path(card) for card in CARDS]
+    return ([(path, 0, TABLE_CARDS_REDUCTION) for path in [BACK_PLAYING_CARD] + faces] +
+            [(path, CARD_BORDER, YOUR_CARDS_REDUCTION) for path in faces])
+
+
+def build_sprites(output_dir: pathlib.Path = SPRITES_DIR):
+    """Render every card at the display resolution and pack them into a single sheet
+    with a JSON index of the positions of the sprites and of the full resolution sizes of the cards.
+    """
+    sprites, sizes = {}, {}
+    for path, border, reduction in sprite_variants():
+        sprites[sprite_key(path, border, reduction)] = render_card_image(path, border, reduction)
+        with Image.open(path) as image:
+            sizes[path.stem] = image.size
+
+    # shelf packing: rows of SHEET_COLUMNS sprites, each row as high as its highest sprite
+    boxes, rows = {}, []
+    keys = list(sprites)
+    for row_start in range(0, len(keys), SHEET_COLUMNS):
+        rows.append(keys[row_start:row_start + SHEET_COLUMNS])
+    y, sheet_width = 0, 0
+    for row in rows:
+        x = 0
+        for key in row:
+            width, height = sprites[key].size
+            boxes[key] = (x, y, width, height)
+            x += width
+        sheet_width = max(sheet_width, x)
+        y += max(sprites[key].size[1] for key in row)
+
+    sheet = Image.new('RGB', (sheet_width, y), color='white')
+    for key, (x, y, _, _) in boxes.items():
+        sheet.paste(sprites[key], (x, y))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sheet.save(output_dir / SHEET_NAME, optimize=True)
+    index = {'sheet': SHEET_NAME, 'sprites': boxes, 'sizes': sizes}
+    (output_dir / 'index.json').write_text(json.dumps(index))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render the card sprites used by the GUI.')
+    parser.add_argument('--output', type=pathlib.Path, default=SPRITES_DIR)
+    args = parser.parse_args()
+    build_sprites(args.output)
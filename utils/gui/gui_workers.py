@@ -1,16 +1,34 @@
-from collections import deque
+from typing import TYPE_CHECKING
 
 import streamlit as st
-import pandas as pd
 
-from utils.player import Player
-from utils.game import Game
-from utils.gui.image_workers import draw_table_cards, draw_your_cards
+from utils.gui.image_workers import draw_table_cards, draw_your_cards, load_sprites, table_card_paths
+from utils.gui.players_table import PlayersTable
+from utils import instrument
+from utils.instrument import instrumented
+
+if TYPE_CHECKING:  # the engine is imported with the first game, the sidebar is shown before that
+    from utils.service import GameService, TableView
 
 
 ROUND_STAGES = ('Pre-flop', 'Flop', 'Turn', 'River')
 
 
+@st.cache_resource
+def get_service() -> 'GameService':
+    """The game service of the process, shared by every session, with the lookup tables
+    and the card images loaded once for all of them.
+    """
+    from utils.service import GameService, warm_up
+    warm_up()
+    load_sprites()
+    return GameService()
+
+
+def table_view() -> 'TableView':
+    return get_service().view(st.session_state['table_id'])
+
+
 def manipulate_css():
     """Fix the sidebar width, center the image, expand the width of the main canvas, and set up custom font size."""
     st.markdown(
@@ -34,12 +52,14 @@ def manipulate_css():
     )
 
 
+@instrumented
 def create_game_layout(new_game=True):
     """This function creates and recreates the whole game layout."""
     if new_game:
         create_new_game()
-    if 'game' not in st.session_state:
+    if 'table_id' not in st.session_state or st.session_state['table_id'] not in get_service():
         return
+    view = table_view()
 
     # create upper row
     col1_outer, col2_outer = st.columns([3, 1])
@@ -48,58 +68,59 @@ def create_game_layout(new_game=True):
         with st.container():
             # create game flow indicators
             col1, col2, col3, col4 = st.columns(4, gap='small')
-            game_round_stage = ROUND_STAGES[st.session_state['round'].stage_idx]
+            game_round_stage = ROUND_STAGES[view.stage_idx]
             col1.markdown(f"Current stage:<p class='big-font'>**{game_round_stage}**</p>",
                           unsafe_allow_html=True)
-            active_player_name = st.session_state['round'].players[0].name
+            active_player_name = view.active_player.name
             col2.markdown(f"Active player:<p class='big-font'>**{active_player_name}**</p>",
                           unsafe_allow_html=True)
-            st.session_state['round'].determine_next_event()
-            action_on_next = st.session_state['round'].next_action
+            action_on_next = view.next_action
             col3.markdown(f"Action on next:<p class='big-font'>**{action_on_next}**</p>",
                           unsafe_allow_html=True)
-            bank_amount = st.session_state['round'].bank
+            bank_amount = view.bank
             col4.markdown(f"Bank amount:<p class='big-font'>**{bank_amount}**</p>",
                           unsafe_allow_html=True)
 
             st.button('Next', key='next_button', on_click=perform_next_action)
 
-            display_table()  # display game table
+            display_table(view)  # display game table
 
             # display your cards
             col1_your_cards, col2_your_cards, col3_your_cards = st.columns([1, 3, 2])
             col1_your_cards.header("Your cards:")
             with col2_your_cards:
-                display_your_cards()
-            if st.session_state['round'].players[0] == st.session_state['you']:
+                display_your_cards(view)
+            if view.you is not None and view.active_player.id == view.you.id:
                 col3_your_cards.button('Check', on_click=perform_next_action)
                 col3_your_cards.button('Fold', on_click=perform_next_action)
                 col3_your_cards.button('Bet', on_click=perform_next_action)
-                col3_your_cards.number_input('Your bet amount', min_value=0, max_value=st.session_state['you'].funds,
+                col3_your_cards.number_input('Your bet amount', min_value=0, max_value=view.you.funds,
                                              step=1, key='your_bet_amount_input',
                                              on_change=create_game_layout, args=(False,))
     # in upper right corner
     with col2_outer:
         if new_game:
-            create_players_table()
+            create_players_table(view)
         else:
-            display_players_table()
+            display_players_table(view)
 
 
 def create_new_game():
     """Initialize a new game provided the input information about the opponents
-    and about the blinds. Store the game in a Streamlit session state.
+    and about the blinds. The game is hosted by the service, the session only keeps the key of its table.
     """
+    from utils.player import Player
+
     # if no change to the opponents table applied (no opponents)
     if not st.session_state['opponents_table']['edited_rows']:
         st.error('No opponents in the game. Select at least one.', icon="🚨")
         return
 
-    if 'game' in st.session_state:
-        del st.session_state['game']
+    if 'table_id' in st.session_state:
+        get_service().close_table(st.session_state.pop('table_id'))
 
     edited_rows = st.session_state['opponents_table']['edited_rows']
-    players = deque()
+    players = []
     for r in edited_rows.items():
         opponent_idx, opponent_changed_values = r[0], r[1]
         # if there is an opponent without the sufficient funds
@@ -117,70 +138,69 @@ def create_new_game():
     min_funds = min([r['Funds'] for r in edited_rows.values() if r['Funds'] >= st.session_state['big_blind_input']])
     your_player = Player('You', 'You', min_funds)
     players.append(your_player)
-    st.session_state['you'] = your_player
 
-    game = Game(players=players,
-                small_blind=st.session_state['small_blind_input'],
-                big_blind=st.session_state['big_blind_input'])
-    game_round = game.play_round()
-    st.session_state['game'] = game
-    st.session_state['round'] = game_round
+    service = get_service()
+    service.close_idle()  # tables of the sessions which have gone away
+    st.session_state['table_id'] = service.create_table(players,
+                                                        small_blind=st.session_state['small_blind_input'],
+                                                        big_blind=st.session_state['big_blind_input'],
+                                                        you=your_player)
 
-    if len(game.initial_players) == 2:
+    if len(players) == 2:
         st.session_state['players_statuses'] = {0: 'active', 1: 'in'}
     else:
         st.session_state['players_statuses'] = {index: 'in' if index != 3 else 'active'
-                                                for index in range(len(game.initial_players))}
+                                                for index in range(len(players))}
 
 
-def create_players_table():
+def create_players_table(view: 'TableView'):
     """Create a non-editable table containing information about the players within a game."""
-    game = st.session_state['game']
-    all_players = game.initial_players
-    all_players_names = [p.name for p in all_players]
-    all_players_funds = [p.funds for p in all_players]
-    all_players_ids = [p.id for p in all_players]
-    blinds = ['Small', 'Big'] + [None for i in range(len(all_players)-2)]
+    st.session_state['players_table'] = PlayersTable(view.players)
 
-    players_df = pd.DataFrame({
-        'Player': all_players_names,
-        'Funds': all_players_funds,
-        'Blinds': blinds
-    }, index=all_players_ids)
-    st.session_state['players_table'] = players_df
+    display_players_table(view)
 
-    display_players_table()
 
-
-def style_players_table():
-    active_player_id = st.session_state['round'].players[0].id
+@instrumented
+def style_players_table(view: 'TableView'):
+    """Update the players table after the last action, the styling is reused unless something has changed."""
     players_table = st.session_state['players_table']
-    idx = pd.IndexSlice
-    slice_ = idx[idx[active_player_id], idx[:]]
-    styled_table = players_table.style.set_properties(
-        **{'background-color': '#ffffb3'}, subset=slice_
-    )
-    return styled_table
+    players_table.sync(view.players, view.active_player)
+    return players_table.styled()
 
 
-def display_players_table():
-    styled_players_table = style_players_table()
+def display_players_table(view: 'TableView'):
+    styled_players_table = style_players_table(view)
     st.dataframe(styled_players_table, hide_index=True)
 
 
-def display_table():
-    """Show a table with community cards."""
-    img_community_cards = draw_table_cards()
+def display_table(view: 'TableView'):
+    """Show a table with the community cards dealt so far, the rest face-down."""
+    img_community_cards = draw_table_cards(table_card_paths(view.community_cards))
     st.image(img_community_cards)
 
 
-def display_your_cards():
+def display_your_cards(view: 'TableView'):
     """Show the cards in your hand."""
-    your_cards = st.session_state['you'].cards
+    your_cards = view.you.cards  # hashable, composed images are memoized by cards
     img_your_cards = draw_your_cards(your_cards)
     st.image(img_your_cards)
 
 
+def display_instrumentation():
+    """Show the call counts and latencies of the instrumented functions, only while POKER_INSTRUMENT is set."""
+    if not instrument.ENABLED:
+        return
+    import pandas as pd
+
+    with st.expander('Instrumentation'):
+        measurements = instrument.snapshot()
+        st.dataframe(pd.DataFrame({name: {key: value for key, value in timer.items() if key != 'histogram'}
+                                   for name, timer in measurements['timers'].items()}).T)
+        st.json(measurements, expanded=False)
+        st.button('Reset', key='reset_instrumentation_button', on_click=instrument.reset)
+
+
 def perform_next_action():
-    st.session_state['round'].next_event() # invoke next event
+    instrument.count('gui.next_action')
+    get_service().act(st.session_state['table_id'])  # invoke next event
     create_game_layout(new_game=False)
@@ -1,55 +1,137 @@
+import json
 import pathlib
-
-from PIL import Image, ImageOps
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 
 from utils.cards import PlayingCard
+from utils.instrument import instrumented
+
+if TYPE_CHECKING:
+    from PIL import Image  # imported on first use, so that importing the module stays cheap
 
 
 BACK_PLAYING_CARD = pathlib.Path('assets') / 'back_playing_card.jpg'
+CARD_BORDER = 10
+CARD_BORDER_COLOR = '#9b908e'
+TABLE_CARDS_REDUCTION = 7
+N_TABLE_CARDS = 5
+YOUR_CARDS_REDUCTION = 9
+COMPOSED_IMAGES_CACHE_SIZE = 1024
+# display-resolution sprites made by `python -m utils.gui.build_sprites`
+SPRITES_DIR = pathlib.Path('assets') / 'sprites'
+SPRITES_INDEX = SPRITES_DIR / 'index.json'
+
+
+def card_image_path(card: PlayingCard) -> pathlib.Path:
+    return pathlib.Path('assets') / 'deck' / f'{card.suit}_{card.rank}.jpg'
+
+
+def table_card_paths(community_cards: tuple[PlayingCard, ...]) -> tuple[pathlib.Path, ...]:
+    """Images of the community cards dealt so far followed by card backs for the ones still to come."""
+    return (tuple(card_image_path(card) for card in community_cards)
+            + (BACK_PLAYING_CARD,) * (N_TABLE_CARDS - len(community_cards)))
+
+
+def sprite_key(path: pathlib.Path, border: int, reduction: int) -> str:
+    return f'{path.stem}:{border}:{reduction}'
+
+
+@lru_cache(maxsize=None)
+def load_sprites() -> Optional[tuple['Image.Image', dict]]:
+    """Decode the sprite sheet once per process and return it with its index, None if it hasn't been built."""
+    from PIL import Image
+    if not SPRITES_INDEX.exists():
+        return None
+    index = json.loads(SPRITES_INDEX.read_text())
+    with Image.open(SPRITES_DIR / index['sheet']) as sheet:
+        sheet.load()
+        return sheet.convert('RGB'), index
+
 
+def render_card_image(path: pathlib.Path, border: int, reduction: int) -> 'Image.Image':
+    """Decode a full resolution card image, add a border around it and downscale it."""
+    from PIL import Image, ImageOps
+    with Image.open(path) as image:
+        if border:
+            image = ImageOps.expand(image, border=border, fill=CARD_BORDER_COLOR)
+        return image.reduce(reduction)
 
+
+@lru_cache(maxsize=None)
+def card_image_size(path: pathlib.Path) -> tuple[int, int]:
+    """Full resolution size of a card image, read only once per process."""
+    from PIL import Image
+    sprites = load_sprites()
+    if sprites is not None and path.stem in sprites[1]['sizes']:
+        return tuple(sprites[1]['sizes'][path.stem])
+    with Image.open(path) as image:
+        return image.size
+
+
+@lru_cache(maxsize=None)
+@instrumented
+def load_card_image(path: pathlib.Path, border: int, reduction: int) -> 'Image.Image':
+    """A card with a border around it at the display resolution, prepared once per process.
+    It is cut out of the sprite sheet if there is one, or rendered from the full resolution image.
+    """
+    sprites = load_sprites()
+    if sprites is not None:
+        sheet, index = sprites
+        box = index['sprites'].get(sprite_key(path, border, reduction))
+        if box is not None:
+            x, y, width, height = box
+            return sheet.crop((x, y, x + width, y + height))
+    return render_card_image(path, border, reduction)
+
+
+def _reduced(value: int, reduction: int) -> int:
+    """Size or position at the display resolution, rounded the way Image.reduce rounds sizes."""
+    return -(-value // reduction)
+
+
+@lru_cache(maxsize=COMPOSED_IMAGES_CACHE_SIZE)
+@instrumented
 def draw_table_cards(
         cards: tuple[pathlib.Path] = (BACK_PLAYING_CARD, BACK_PLAYING_CARD, BACK_PLAYING_CARD,
                                       BACK_PLAYING_CARD, BACK_PLAYING_CARD)
 ):
     """Draw five cards side by side.
-    By default, all of them are drawn face-down."""
-    first_ind_image = Image.open(cards[0])
-    ind_width, ind_height = first_ind_image.size
+    By default, all of them are drawn face-down.
+    The layout is computed at full resolution while the already downscaled cards are pasted,
+    and the result is memoized for every combination of cards."""
+    from PIL import Image
+    ind_width, ind_height = card_image_size(cards[0])
     # Define the spacing between individual cards
     spacing = round(ind_width * 0.4)
     # Create a new blank image to hold the row of cards
     row_width = (ind_width + spacing) * len(cards) - spacing
     row_height = ind_height*2
-    row_image = Image.new('RGB', (row_width, row_height), color='white')
+    row_image = Image.new('RGB', (_reduced(row_width, TABLE_CARDS_REDUCTION),
+                                  _reduced(row_height, TABLE_CARDS_REDUCTION)), color='white')
     # Paste the cards into the row image with spacing
     for i in range(len(cards)):
-        ind_image = Image.open(cards[i])
-        position = (i * (ind_width + spacing), round(row_height*0.25))  # Position to paste the image
+        ind_image = load_card_image(cards[i], 0, TABLE_CARDS_REDUCTION)
+        position = (round(i * (ind_width + spacing) / TABLE_CARDS_REDUCTION),
+                    round(row_height * 0.25 / TABLE_CARDS_REDUCTION))  # Position to paste the image
         row_image.paste(ind_image, position)
-    return row_image.reduce(7)
+    return row_image
 
 
+@lru_cache(maxsize=COMPOSED_IMAGES_CACHE_SIZE)
+@instrumented
 def draw_your_cards(cards: tuple[PlayingCard]):
-    """Draw your two cards side by side."""
-
-    def get_card_image(card: PlayingCard):
-        rank, suit = card.rank, card.suit
-        path_to_img = pathlib.Path('assets') / 'deck' / f'{suit}_{rank}.jpg'
-        ind_image = Image.open(path_to_img)
-        img_with_border = ImageOps.expand(ind_image, border=10, fill='#9b908e')  # add a thin line around the image
-        return img_with_border
-
-    first_ind_image = get_card_image(cards[0])
-    ind_width, ind_height = first_ind_image.size
+    """Draw your two cards side by side. The result is memoized for every pair of cards."""
+    from PIL import Image
+    ind_width, ind_height = card_image_size(card_image_path(cards[0]))
+    ind_width, ind_height = ind_width + 2 * CARD_BORDER, ind_height + 2 * CARD_BORDER
     spacing = round(ind_width * 0.1)
     # Create a new blank image to hold the row of cards
     row_width = (ind_width + spacing) * len(cards) - spacing
-    row_image = Image.new('RGB', (row_width, ind_height), color='white')
-
-    second_ind_image = get_card_image(cards[1])
+    row_image = Image.new('RGB', (_reduced(row_width, YOUR_CARDS_REDUCTION),
+                                  _reduced(ind_height, YOUR_CARDS_REDUCTION)), color='white')
 
-    for i, img in enumerate([first_ind_image, second_ind_image]):
-        position = (i * (ind_width + spacing), 0)
+    for i, card in enumerate(cards[:2]):
+        img = load_card_image(card_image_path(card), CARD_BORDER, YOUR_CARDS_REDUCTION)
+        position = (round(i * (ind_width + spacing) / YOUR_CARDS_REDUCTION), 0)
         row_image.paste(img, position)
-    return row_image.reduce(9)
+    return row_image
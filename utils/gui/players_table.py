@@ -0,0 +1,72 @@
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from utils.instrument import instrumented
+
+if TYPE_CHECKING:  # pandas is imported with the first table, so that importing the module stays cheap
+    import pandas as pd
+    from pandas.io.formats.style import Styler
+
+    from utils.service import PlayerView
+
+
+ACTIVE_PLAYER_COLOR = '#ffffb3'
+BLINDS = ('Small', 'Big')
+
+
+class PlayersTable:
+    """View model of the table of the players shown next to the game.
+
+    The DataFrame is built once per game from the views of its players and then kept in place: `sync`
+    writes only the funds which have changed since the last view and moves the highlight of the active
+    player, and the styled table is recomputed only after one of them has actually changed, so the reruns
+    in between reuse it.
+
+    Attributes
+    ----------
+    frame : pd.DataFrame
+        Names, funds and blinds of the players indexed by their ids.
+    active_id : Optional[int]
+        Id of the highlighted player.
+    """
+
+    def __init__(self, players: Sequence['PlayerView']):
+        import pandas as pd
+        self.frame = pd.DataFrame({
+            'Player': [p.name for p in players],
+            'Funds': [p.funds for p in players],
+            'Blinds': list(BLINDS[:len(players)]) + [None] * (len(players) - len(BLINDS)),
+        }, index=[p.id for p in players])
+        self._funds = [p.funds for p in players]
+        self.active_id: Optional[int] = None
+        self._styled: Optional['Styler'] = None
+
+    def sync(self, players: Sequence['PlayerView'], active_player: Optional['PlayerView'] = None) -> bool:
+        """Bring the table up to date with newer views of the players in the order of the rows,
+        returns whether anything has changed.
+        """
+        changed = False
+        funds_column = self.frame.columns.get_loc('Funds')
+        for row, player in enumerate(players):
+            if player.funds != self._funds[row]:
+                self._funds[row] = player.funds
+                self.frame.iat[row, funds_column] = player.funds
+                changed = True
+        active_id = None if active_player is None else active_player.id
+        if active_id != self.active_id:
+            self.active_id = active_id
+            changed = True
+        if changed:
+            self._styled = None
+        return changed
+
+    @instrumented
+    def styled(self) -> 'Styler':
+        """The table with the active player highlighted, computed again only after a change."""
+        if self._styled is None:
+            import pandas as pd
+            styled = self.frame.style
+            if self.active_id in self.frame.index:
+                styled = styled.set_properties(**{'background-color': ACTIVE_PLAYER_COLOR},
+                                               subset=pd.IndexSlice[[self.active_id], :])
+            self._styled = styled
+        return self._styled
@@ -0,0 +1,153 @@
+import gzip
+import os
+from enum import IntEnum
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+MAX_CARDS_PER_RECORD = 3  # the flop
+NO_CARD = -1
+NO_SEAT = -1
+DEFAULT_BUFFER_RECORDS = 8_192
+
+# Every event of a hand is a fixed-width little-endian record, so a log is a flat array on disk.
+HISTORY_DTYPE = np.dtype([
+    ('hand', '<u4'),  # number of the hand in the log
+    ('event', 'u1'),  # see Event
+    ('stage', 'u1'),  # stage index of the round
+    ('seat', 'i1'),  # seat index, -1 for the table
+    ('cards', 'i1', (MAX_CARDS_PER_RECORD,)),  # integer-encoded cards, -1 padded
+    ('amount', '<i8'),  # chips, or the number of seats for START
+])
+
+
+class Event(IntEnum):
+    """Kinds of the records of a hand history."""
+    START = 0  # a new hand, the amount is the number of seats
+    SEAT = 1  # the stack of a seat at the start of the hand
+    HOLE_CARDS = 2
+    BOARD_CARDS = 3
+    BLIND = 4
+    FOLD = 5
+    CHECK = 6  # FOLD to RAISE follow the order of opponents.Action
+    CALL = 7
+    RAISE = 8
+    PAYOUT = 9  # chips won by a seat at the end of the hand
+    DECK_SEED = 10  # seed the deck of the hand was shuffled with, so that the hand can be replayed
+
+
+class HandHistoryWriter:
+    """Append-only writer of hand histories. Records are buffered and written in blocks,
+    optionally through gzip, whose members can be appended to an existing file.
+
+    Attributes
+    ----------
+    path : str
+        Path of the log.
+    hand : int
+        Number of the current hand, continues the numbering of an existing log.
+    n_records : int
+        Number of records written by this writer, including the buffered ones.
+    """
+
+    def __init__(self, path: str, compress: bool = False, buffer_records: int = DEFAULT_BUFFER_RECORDS,
+                 compresslevel: int = 6):
+        self.path = path
+        self.buffer_records = buffer_records
+        self.hand = -1
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            if _is_compressed(path) != compress:
+                raise ValueError(f'Can not append {"compressed" if compress else "uncompressed"} records '
+                                 f'to the log {path!r}, which is {"not " if compress else ""}compressed.')
+            self.hand = _last_hand(path)
+        self._file = gzip.open(path, 'ab', compresslevel=compresslevel) if compress else open(path, 'ab')
+        self._buffer = []
+        self.n_records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, event: Event, stage: int = 0, seat: int = NO_SEAT, cards: Sequence[int] = (), amount: int = 0):
+        cards = tuple(cards) + (NO_CARD,) * (MAX_CARDS_PER_RECORD - len(cards))
+        self._buffer.append((self.hand, event, stage, seat, cards, amount))
+        self.n_records += 1
+        if len(self._buffer) >= self.buffer_records:
+            self.flush()
+
+    def start_hand(self, stacks: Sequence[int], seed: Optional[int] = None) -> int:
+        """Open a new hand with the stacks of the seats and return its number."""
+        self.hand += 1
+        self.write(Event.START, amount=len(stacks))
+        if seed is not None:
+            self.write(Event.DECK_SEED, amount=seed)
+        for seat, stack in enumerate(stacks):
+            self.write(Event.SEAT, seat=seat, amount=stack)
+        return self.hand
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(np.array(self._buffer, dtype=HISTORY_DTYPE).tobytes())
+            self._buffer = []
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def _is_compressed(path: str) -> bool:
+    with open(path, 'rb') as file:
+        return file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+
+def _last_hand(path: str) -> int:
+    """Number of the last hand of a log, -1 if it has no complete record. A compressed log is
+    decompressed block by block, so it is never held in memory as a whole.
+    """
+    if not _is_compressed(path):
+        if os.path.getsize(path) < HISTORY_DTYPE.itemsize:
+            return -1
+        records = read_history(path)
+        return int(records['hand'][-1]) if len(records) else -1
+    block_size = DEFAULT_BUFFER_RECORDS * HISTORY_DTYPE.itemsize
+    last, tail = -1, b''
+    with gzip.open(path, 'rb') as file:
+        while block := file.read(block_size):
+            data = tail + block
+            n_complete = len(data) // HISTORY_DTYPE.itemsize
+            if n_complete:
+                last_record = data[(n_complete - 1) * HISTORY_DTYPE.itemsize:n_complete * HISTORY_DTYPE.itemsize]
+                last = int(np.frombuffer(last_record, dtype=HISTORY_DTYPE)['hand'][0])
+            tail = data[n_complete * HISTORY_DTYPE.itemsize:]
+    return last
+
+
+def read_history(path: str) -> np.ndarray:
+    """Records of a log as a structured array. Uncompressed logs are memory-mapped, so only the
+    pages which are actually touched are read; compressed ones are decompressed into memory.
+    """
+    if _is_compressed(path):
+        with gzip.open(path, 'rb') as file:
+            return np.frombuffer(file.read(), dtype=HISTORY_DTYPE)
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=HISTORY_DTYPE)
+    return np.memmap(path, dtype=HISTORY_DTYPE, mode='r')
+
+
+def hand_bounds(records: np.ndarray) -> np.ndarray:
+    """Start of every hand in the records and the end of the last one."""
+    starts = np.flatnonzero(records['event'] == Event.START)
+    return np.append(starts, len(records))
+
+
+def iter_hands(records: np.ndarray, first: int = 0, last: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Records of every hand, as views of the given array."""
+    bounds = hand_bounds(records)
+    for start, end in zip(bounds[first:last], bounds[first + 1:None if last is None else last + 1]):
+        yield records[start:end]
@@ -0,0 +1,192 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+# read once at import: while it is off `instrumented` returns the functions untouched and `count` does nothing
+ENABLED = os.environ.get('POKER_INSTRUMENT', '') not in ('', '0')
+# written at exit when set, '{pid}' in the path is replaced by the process id to keep the workers apart
+OUTPUT_FILE = os.environ.get('POKER_INSTRUMENT_FILE')
+N_BUCKETS = 32  # latency histogram buckets, every one twice as wide as the previous one
+FIRST_BUCKET_BITS = 10  # the first bucket holds calls shorter than 2 ** 10 ns, about a microsecond
+PROFILE_MODES = ('cprofile', 'sample')
+DEFAULT_SAMPLE_INTERVAL = 0.005  # seconds between the samples of the sampling profiler
+
+
+class Timer:
+    """Number of calls of a function, their total duration and a histogram of their latencies.
+
+    Attributes
+    ----------
+    calls : int
+        Number of finished calls.
+    total_ns : int
+        Sum of their durations in nanoseconds.
+    buckets : list[int]
+        Number of calls whose duration fell into every bucket, see `bucket_bounds`.
+    """
+    __slots__ = ('calls', 'total_ns', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.buckets = [0] * N_BUCKETS
+
+    def add(self, elapsed_ns: int):
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        self.buckets[min((elapsed_ns >> FIRST_BUCKET_BITS).bit_length(), N_BUCKETS - 1)] += 1
+
+    def summary(self) -> dict:
+        """Counts and latencies in seconds, the histogram maps the upper bound of every non-empty bucket
+        to its number of calls.
+        """
+        bounds = bucket_bounds()
+        return {'calls': self.calls,
+                'total_seconds': self.total_ns / 1e9,
+                'mean_seconds': self.total_ns / self.calls / 1e9 if self.calls else 0.0,
+                'histogram': {f'{bound:.3g}': n for bound, n in zip(bounds, self.buckets) if n}}
+
+
+def bucket_bounds() -> list[float]:
+    """Upper bound of every histogram bucket in seconds, the last bucket is unbounded."""
+    return [2 ** (FIRST_BUCKET_BITS + i) / 1e9 for i in range(N_BUCKETS - 1)] + [float('inf')]
+
+
+TIMERS: dict[str, Timer] = {}
+COUNTERS: Counter = Counter()
+_lock = threading.Lock()  # Streamlit runs every session in a thread of its own
+
+
+def instrumented(function: Optional[Callable] = None, *, name: Optional[str] = None):
+    """Time every call of the decorated function under its qualified name, or the given one.
+    Returns the function itself while the instrumentation is off. Place it below caching decorators
+    such as lru_cache to time only the calls which do the work.
+    """
+    def decorate(function: Callable) -> Callable:
+        if not ENABLED:
+            return function
+        timer = TIMERS.setdefault(name or f'{function.__module__}.{function.__qualname__}', Timer())
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                with _lock:
+                    timer.add(elapsed)
+        return wrapper
+    return decorate if function is None else decorate(function)
+
+
+def count(name: str, n: int = 1):
+    """Add to a named counter while the instrumentation is on."""
+    if ENABLED:
+        with _lock:
+            COUNTERS[name] += n
+
+
+def snapshot() -> dict:
+    """Current measurements of every timer and counter, ready to be dumped to JSON."""
+    with _lock:
+        return {'timers': {name: timer.summary() for name, timer in sorted(TIMERS.items())},
+                'counters': dict(sorted(COUNTERS.items()))}
+
+
+def reset():
+    """Zero the timers and the counters, the timers stay attached to the instrumented functions."""
+    with _lock:
+        for timer in TIMERS.values():
+            timer.__init__()
+        COUNTERS.clear()
+
+
+def dump(path: str):
+    """Write the measurements into a JSON file, '{pid}' in the path is replaced by the process id."""
+    with open(path.replace('{pid}', str(os.getpid())), 'w') as file:
+        json.dump(snapshot(), file, indent=2)
+
+
+if ENABLED and OUTPUT_FILE:
+    atexit.register(dump, OUTPUT_FILE)
+
+
+class SamplingProfiler:
+    """Samples the stack of a thread at a fixed interval from a background thread.
+
+    Stacks are counted in the collapsed format of flame graph tools, one line per stack with the frames
+    from the outermost one separated by semicolons and followed by the number of samples.
+
+    Attributes
+    ----------
+    interval : float
+        Seconds between the samples.
+    thread_id : int
+        Thread whose stack is sampled, the one which made the profiler by default.
+    stacks : Counter
+        Number of samples of every collapsed stack.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, 'w') as file:
+            for stack, n in self.stacks.most_common():
+                file.write(f'{stack} {n}\n')
+
+
+@contextmanager
+def capture(mode: str, path: str) -> Iterator[None]:
+    """Profile the enclosed code of the current thread and write the profile into the path:
+    'cprofile' writes pstats data, 'sample' writes the collapsed stacks of a SamplingProfiler.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f'Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}.')
+    if mode == 'cprofile':
+        import cProfile
+    profiler = cProfile.Profile() if mode == 'cprofile' else SamplingProfiler()
+    if mode == 'cprofile':
+        profiler.enable()
+    else:
+        profiler.start()
+    try:
+        yield
+    finally:
+        if mode == 'cprofile':
+            profiler.disable()
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            profiler.dump(path)
@@ -0,0 +1,169 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import NamedTuple
+
+
+RECENT_ACTIONS = 32  # length of the ring buffer of the latest actions of every player
+MAX_TRACKED_PLAYERS = 1_024  # the least recently seen players are forgotten beyond that
+DEFAULT_DECAY = 0.995  # weight of the past per hand, 1 keeps plain counts
+
+
+class Action(IntEnum):
+    """Kinds of the actions of a player."""
+    FOLD = 0
+    CHECK = 1
+    CALL = 2
+    RAISE = 3  # any bet above the amount to call, including the first bet of a stage
+
+    @classmethod
+    def classify(cls, bet: int, to_call: int) -> 'Action':
+        """Kind of an action from the bet returned by a player, -1 to fold.
+        A short all-in call is still a call.
+        """
+        if bet == -1:
+            return cls.FOLD
+        if bet > to_call:
+            return cls.RAISE
+        return cls.CALL if to_call else cls.CHECK
+
+
+class ActionRecord(NamedTuple):
+    stage_idx: int
+    action: Action
+    amount: int
+    to_call: int
+
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    """Frequencies describing how a player plays, all of them between 0 and 1.
+
+    Attributes
+    ----------
+    hands : float
+        (Decayed) number of hands the frequencies are based on.
+    vpip : float
+        Share of the hands in which the player voluntarily put money in before the flop.
+    pfr : float
+        Share of the hands in which the player raised before the flop.
+    aggression : float
+        Share of raises among the actions other than checks.
+    fold_to_bet : float
+        Share of folds among the actions facing a bet.
+    """
+    hands: float = 0.0
+    vpip: float = 0.0
+    pfr: float = 0.0
+    aggression: float = 0.0
+    fold_to_bet: float = 0.0
+
+
+class PlayerStats:
+    """Streaming statistics of a single player. Counters are multiplied by `decay` at the start
+    of every hand, so the recent hands weigh more and the memory doesn't depend on the number of hands.
+    """
+    __slots__ = ('decay', 'hands', 'vpip_hands', 'pfr_hands', 'raises', 'calls', 'folds', 'faced_bets',
+                 'folds_to_bet', 'recent', '_in_pot', '_raised', '_snapshot')
+
+    def __init__(self, decay: float = DEFAULT_DECAY, recent_actions: int = RECENT_ACTIONS):
+        self.decay = decay
+        self.hands = self.vpip_hands = self.pfr_hands = 0.0
+        self.raises = self.calls = self.folds = self.faced_bets = self.folds_to_bet = 0.0
+        self.recent: deque[ActionRecord] = deque(maxlen=recent_actions)
+        self._in_pot = self._raised = False  # flags of the current hand
+        self._snapshot = StatsSnapshot()
+
+    def start_hand(self):
+        decay = self.decay
+        self.hands = self.hands * decay + 1
+        self.vpip_hands *= decay
+        self.pfr_hands *= decay
+        self.raises *= decay
+        self.calls *= decay
+        self.folds *= decay
+        self.faced_bets *= decay
+        self.folds_to_bet *= decay
+        self._in_pot = self._raised = False
+        self._snapshot = None
+
+    def record(self, stage_idx: int, action: Action, amount: int, to_call: int):
+        self.recent.append(ActionRecord(stage_idx, action, amount, to_call))
+        if action == Action.RAISE:
+            self.raises += 1
+        elif action == Action.CALL:
+            self.calls += 1
+        elif action == Action.FOLD:
+            self.folds += 1
+        if to_call:
+            self.faced_bets += 1
+            self.folds_to_bet += action == Action.FOLD
+        if stage_idx == 0 and action in (Action.CALL, Action.RAISE):
+            if not self._in_pot:
+                self._in_pot = True
+                self.vpip_hands += 1
+            if action == Action.RAISE and not self._raised:
+                self._raised = True
+                self.pfr_hands += 1
+        self._snapshot = None
+
+    def snapshot(self) -> StatsSnapshot:
+        """Current frequencies, computed once after every update."""
+        if self._snapshot is None:
+            hands = self.hands or 1.0
+            n_actions = self.raises + self.calls + self.folds
+            self._snapshot = StatsSnapshot(
+                hands=self.hands,
+                vpip=self.vpip_hands / hands,
+                pfr=self.pfr_hands / hands,
+                aggression=self.raises / n_actions if n_actions else 0.0,
+                fold_to_bet=self.folds_to_bet / self.faced_bets if self.faced_bets else 0.0,
+            )
+        return self._snapshot
+
+
+class OpponentStats:
+    """Statistics of the players met at the table, updated by Round as the actions happen.
+    Players are identified by their names, at most `max_players` of them are kept.
+    """
+
+    def __init__(self, decay: float = DEFAULT_DECAY, recent_actions: int = RECENT_ACTIONS,
+                 max_players: int = MAX_TRACKED_PLAYERS):
+        self.decay = decay
+        self.recent_actions = recent_actions
+        self.max_players = max_players
+        self._players: OrderedDict[str, PlayerStats] = OrderedDict()
+
+    def __len__(self):
+        return len(self._players)
+
+    def __contains__(self, name: str):
+        return name in self._players
+
+    def _stats_of(self, name: str) -> PlayerStats:
+        stats = self._players.get(name)
+        if stats is None:
+            stats = self._players[name] = PlayerStats(self.decay, self.recent_actions)
+            if len(self._players) > self.max_players:
+                self._players.popitem(last=False)
+        else:
+            self._players.move_to_end(name)
+        return stats
+
+    def start_hand(self, names):
+        """A new hand is dealt to the given players."""
+        for name in names:
+            self._stats_of(name).start_hand()
+
+    def record(self, name: str, stage_idx: int, action: Action, amount: int, to_call: int):
+        self._stats_of(name).record(stage_idx, action, amount, to_call)
+
+    def snapshot(self, name: str) -> StatsSnapshot:
+        """Frequencies of a player, all zeros for a player never seen."""
+        stats = self._players.get(name)
+        return stats.snapshot() if stats is not None else StatsSnapshot()
+
+    def recent(self, name: str) -> list[ActionRecord]:
+        """The latest actions of a player, the oldest first."""
+        stats = self._players.get(name)
+        return list(stats.recent) if stats is not None else []
@@ -1,34 +1,86 @@
 import itertools
 from typing import Optional
 
-from utils.ai import PokerHand
+from utils.ai import HandState, Mind, PokerHand, hand_category
+from utils.board_cache import MIN_BOARD_CARDS, BoardCache
 from utils.cards import PlayingCard
+from utils.equity import EquityResult, calculate_equity
+from utils.opponents import OpponentStats
+from utils.preflop import preflop_equity
+from utils.ranges import HandRange, range_vs_range
 
 
 class Player:
     id_iter = itertools.count() # in order to assign new id to each new class instance
 
-    def __init__(self, name, behavior='Standard', funds=200):
+    def __init__(self, name, behavior='Standard', funds=200, policy=None):
         self.name = name
         self.id = next(self.id_iter)
         self.behavior = behavior
         self.funds = funds
         self.cards = []
+        self.hand = HandState()  # tracks the hole cards together with the community cards seen so far
+        self.equity: Optional[EquityResult] = None
+        # a callable (player, community_cards, n_opponents, to_call, pot) -> bet, -1 to fold, which makes
+        # the decisions; a Game gives the players without one the policy of their behavior, see utils.policies
+        self.policy = policy
+        # statistics of everybody at the table, given by the round the player is dealt into
+        self.opponent_stats: Optional[OpponentStats] = None
 
     def receive_card(self, cards: list[PlayingCard]):
         """Add a card to a hand."""
         self.cards.extend(cards)
+        self.hand.add([card.index for card in cards])
 
-    def evaluate_poker_hand(self, community_cards: list[Optional[PlayingCard]]) -> PokerHand:
-        """Determine the current stance in terms of the available cards."""
+    def see_community_cards(self, cards: list[PlayingCard]):
+        """Take into account new cards dealt to the table."""
+        self.hand.add([card.index for card in cards])
+
+    def clear_cards(self):
+        """Give the cards back before a new round."""
+        self.cards = []
+        self.hand.clear()
+
+    def evaluate_poker_hand(self, community_cards: Optional[list[PlayingCard]] = None,
+                            board_cache: Optional[BoardCache] = None) -> PokerHand:
+        """Determine the current stance in terms of the available cards.
+        Without community cards given the ones seen so far in the round are used.
+        With a board cache the hand is looked up among the values of every hand on the given board.
+        """
+        if community_cards is None:
+            return self.hand.category()
+        if board_cache is not None and len(community_cards) >= MIN_BOARD_CARDS:
+            value, = board_cache.hand_values([[card.index for card in self.cards]], community_cards)
+            return hand_category(int(value))
         all_cards = self.cards + community_cards
+        return Mind(all_cards).evaluate_hand_strength()
+
+    def estimate_equity(self, community_cards: list[PlayingCard], n_opponents: int, **kwargs) -> EquityResult:
+        """Estimate the chances of the hand against random hands of the opponents.
+        Before the flop the answer is read from the preflop table if it has been built.
+        Keyword arguments are passed to `calculate_equity`.
+        """
+        if not community_cards:
+            equity = preflop_equity(self.cards, n_opponents)
+            if equity is not None:
+                return equity
+        return calculate_equity(self.cards, community_cards, n_opponents, **kwargs)
+
+    def estimate_range_equity(self, community_cards: list[PlayingCard], opponent_range: HandRange, **kwargs) -> float:
+        """Equity of the hand against the range of hands an opponent may hold, the own cards and the board
+        removed from it. Keyword arguments are passed to `range_vs_range`.
+        """
+        equity, _ = range_vs_range(HandRange.from_cards(self.cards), opponent_range.without(self.cards),
+                                   community_cards, **kwargs)
+        return equity
 
     def show_cards(self):
         """Showing cards when finishing game."""
         return ', '.join(map(str, self.cards))
 
     def do_bet(self, amount: int):
-        """Match of increase the current open bet; do blinds."""
+        """Match of increase the current open bet; do blinds. A bet can't exceed the funds."""
+        amount = min(amount, self.funds)
         self.funds -= amount
         return amount
 
@@ -42,10 +94,19 @@ class Player:
         """Pass the action to the next player. Do not bet."""
         return 0
 
-    def analyze_and_act(self, community_cards):
-        # TODO: define some logic here the factors are: community cards, player cards, other players' actions (bets
-        #  of the round, how impulsive some of them were)
-        action_from_analysis = self.check()
+    @staticmethod
+    def call(to_call: int):
+        """Match the highest bet of the stage."""
+        return to_call
+
+    def analyze_and_act(self, community_cards, n_opponents=1, to_call=0, pot=0):
+        """Decide on the bet, -1 to fold, by delegating to the policy of the player."""
+        if self.policy is not None:
+            return self.policy(self, community_cards, n_opponents, to_call, pot)
+        # a player without a policy checks or calls
+        if not community_cards:  # pre-flop equity is a single read from the preflop table
+            self.equity = preflop_equity(self.cards, n_opponents)
+        action_from_analysis = self.call(to_call) if to_call else self.check()
         return action_from_analysis
 
 
@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import numpy as np
+
+from utils.ai import evaluate_batch
+from utils.board_cache import BOARD_CACHE, CARD_COMBOS, COMBO_INDEX, BoardCache
+from utils.cards import N_CARDS
+from utils.equity import N_COMMUNITY_CARDS, STAGE_COMMUNITY_CARDS
+from utils.preflop import MAX_OPPONENTS, TABLE_FIELDS, hand_classes, load_preflop_table
+
+
+DEFAULT_STRENGTH_SAMPLES = 32  # opponent hands sampled to estimate the strength of a hand after the flop
+MIN_RAISE = 2
+EQUITY_FIELD = TABLE_FIELDS.index('equity')
+
+
+@dataclass
+class Observation:
+    """What a player to act sees, with the same fields as BatchObservation, one row per decision.
+
+    Attributes
+    ----------
+    stage_idx : np.ndarray
+        Stage of the round, see Round.stage_idx.
+    hole_cards : np.ndarray
+        Integer-encoded cards of the player, shape (n, 2).
+    community_cards : np.ndarray
+        Cards on the table, shape (n, 5), -1 for the cards which haven't been dealt yet.
+    to_call, funds, pot, n_opponents : np.ndarray
+        Amount to call, funds of the player, amount in the bank and number of other players still in the round.
+    """
+    stage_idx: np.ndarray
+    hole_cards: np.ndarray
+    community_cards: np.ndarray
+    to_call: np.ndarray
+    funds: np.ndarray
+    pot: np.ndarray
+    n_opponents: np.ndarray
+
+    def __len__(self):
+        return len(self.stage_idx)
+
+    @classmethod
+    def of_player(cls, player, community_cards, n_opponents: int, to_call: int, pot: int) -> 'Observation':
+        """A single row observation of a Player about to act in a Round."""
+        board = [card.index for card in community_cards]
+        board += [-1] * (N_COMMUNITY_CARDS - len(board))
+        return cls(stage_idx=np.array([STAGE_COMMUNITY_CARDS.index(len(community_cards))]),
+                   hole_cards=np.array([[card.index for card in player.cards]]),
+                   community_cards=np.array([board]),
+                   to_call=np.array([to_call]),
+                   funds=np.array([player.funds]),
+                   pot=np.array([pot]),
+                   n_opponents=np.array([n_opponents]))
+
+
+def preflop_strength(hole_cards: np.ndarray, n_opponents: np.ndarray) -> np.ndarray:
+    """Equity of the hole cards against the number of opponents read from the preflop table,
+    the equity of an average hand if the table hasn't been built.
+    """
+    table = load_preflop_table()
+    n_opponents = np.clip(n_opponents, 1, MAX_OPPONENTS)
+    if table is None:
+        return 1 / (n_opponents + 1)
+    return np.asarray(table[hand_classes(hole_cards), n_opponents - 1, EQUITY_FIELD], dtype=np.float64)
+
+
+def postflop_strength(hole_cards: np.ndarray, board: np.ndarray, n_opponents: np.ndarray,
+                      rng: np.random.Generator, n_samples: int = DEFAULT_STRENGTH_SAMPLES) -> np.ndarray:
+    """Share of the sampled opponent hands the current hand beats (ties count half) raised to the number
+    of opponents. All rows must have the same number of community cards.
+    """
+    n = len(hole_cards)
+    known = np.concatenate([hole_cards, board], axis=1)
+    seen = np.zeros((n, N_CARDS), dtype=bool)
+    seen[np.arange(n)[:, None], known] = True
+    unseen = np.argsort(seen, axis=1, kind='stable')  # unseen cards first, in order
+    n_unseen = N_CARDS - known.shape[1]
+    first = rng.integers(0, n_unseen, size=(n, n_samples))
+    second = rng.integers(0, n_unseen - 1, size=(n, n_samples))
+    second += second >= first  # two distinct cards
+    rows = np.arange(n)[:, None]
+    opponent = np.stack([unseen[rows, first], unseen[rows, second]], axis=2)
+
+    hero_values, _ = evaluate_batch(known)
+    boards = np.broadcast_to(board[:, None, :], (n, n_samples, board.shape[1]))
+    opponent_values, _ = evaluate_batch(np.concatenate([opponent, boards], axis=2).reshape(n * n_samples, -1))
+    opponent_values = opponent_values.reshape(n, n_samples)
+    wins = (hero_values[:, None] > opponent_values).sum(axis=1)
+    ties = (hero_values[:, None] == opponent_values).sum(axis=1)
+    return ((wins + ties / 2) / n_samples) ** n_opponents
+
+
+def cached_strength(hole_cards: np.ndarray, board: np.ndarray, n_opponents: np.ndarray,
+                    board_cache: BoardCache) -> np.ndarray:
+    """Share of all the opponent hands the current hand beats (ties count half) raised to the number
+    of opponents, read from the values of every combo on the board kept by the board cache.
+    The decisions of a stage share its board, so the board is evaluated once for all of them.
+    """
+    rows = np.arange(len(hole_cards))[:, None]
+    values = np.stack([board_cache.values(cards) for cards in board.tolist()])
+    hero_values = values[rows[:, 0], COMBO_INDEX[hole_cards[:, 0], hole_cards[:, 1]]]
+    live = values >= 0  # the combos holding a board card are -1
+    live[rows, CARD_COMBOS[hole_cards[:, 0]]] = live[rows, CARD_COMBOS[hole_cards[:, 1]]] = False
+    wins = (live & (values < hero_values[:, None])).sum(axis=1)
+    ties = (live & (values == hero_values[:, None])).sum(axis=1)
+    return ((wins + ties / 2) / live.sum(axis=1)) ** n_opponents
+
+
+class ThresholdPolicy:
+    """Decides by comparing the strength of the hand with the pot odds.
+
+    A hand at least `raise_strength` strong raises by `raise_fraction` of the pot, a hand stronger than
+    the pot odds plus `call_margin` calls, the rest checks when it can and folds otherwise.
+    Decisions are made for many rows at once by `batch`, which matches BatchPolicy; calling the policy
+    like a Player.policy makes a single row decision through it.
+
+    Attributes
+    ----------
+    raise_strength : float
+        Strength from which the hand raises.
+    raise_fraction : float
+        Size of a raise relative to the pot.
+    call_margin : float
+        Strength above the pot odds needed to call, negative values call loose.
+    n_samples : int
+        Opponent hands sampled to estimate the strength after the flop without a board cache.
+    rng : np.random.Generator
+        Source of the sampled opponent hands.
+    board_cache : Optional[BoardCache]
+        Cache the strength after the flop is read from against all the opponent hands, see cached_strength.
+    """
+
+    def __init__(self, raise_strength: float, raise_fraction: float, call_margin: float,
+                 n_samples: int = DEFAULT_STRENGTH_SAMPLES, rng: Optional[np.random.Generator] = None,
+                 board_cache: Optional[BoardCache] = None):
+        self.raise_strength = raise_strength
+        self.raise_fraction = raise_fraction
+        self.call_margin = call_margin
+        self.n_samples = n_samples
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.board_cache = board_cache
+
+    def __call__(self, player, community_cards, n_opponents, to_call, pot):
+        observation = Observation.of_player(player, community_cards, n_opponents, to_call, pot)
+        return int(self.batch(observation)[0])
+
+    def strength(self, observation) -> np.ndarray:
+        """Strength of the hands of the rows, grouped by stage so that every group has the same board size."""
+        strength = np.empty(len(observation))
+        stage_idx = observation.stage_idx
+        for stage in sorted(set(stage_idx.tolist())):  # cheaper than np.unique for the single row decisions
+            rows = np.flatnonzero(stage_idx == stage)
+            hole_cards, n_opponents = observation.hole_cards[rows], observation.n_opponents[rows]
+            if stage == 0:
+                strength[rows] = preflop_strength(hole_cards, n_opponents)
+            else:
+                board = observation.community_cards[rows, :STAGE_COMMUNITY_CARDS[stage]]
+                if self.board_cache is not None:
+                    strength[rows] = cached_strength(hole_cards, board, n_opponents, self.board_cache)
+                else:
+                    strength[rows] = postflop_strength(hole_cards, board, n_opponents, self.rng, self.n_samples)
+        return strength
+
+    def batch(self, observation) -> np.ndarray:
+        """Bets of all the rows of an observation, -1 to fold."""
+        strength = self.strength(observation)
+        to_call, pot = observation.to_call, observation.pot
+        pot_odds = to_call / np.maximum(pot + to_call, 1)
+        raise_to = to_call + np.maximum(np.round(self.raise_fraction * pot).astype(np.int64), MIN_RAISE)
+        calls = np.where(strength >= pot_odds + self.call_margin, to_call, np.where(to_call > 0, -1, 0))
+        return np.where(strength >= self.raise_strength, raise_to, calls)
+
+
+def behavior_policies(seed: Union[int, np.random.Generator, None] = None,
+                      board_cache: Optional[BoardCache] = BOARD_CACHE) -> dict[str, ThresholdPolicy]:
+    """Policies of the built-in behaviors sharing a generator seeded with `seed`, or the given generator.
+    They read the strength after the flop from the board cache, sampling opponent hands only without one.
+    """
+    rng = np.random.default_rng(seed)
+    return {
+        'Standard': ThresholdPolicy(raise_strength=0.7, raise_fraction=0.5, call_margin=0.0, rng=rng,
+                                    board_cache=board_cache),
+        'Risky': ThresholdPolicy(raise_strength=0.55, raise_fraction=1.0, call_margin=-0.1, rng=rng,
+                                 board_cache=board_cache),
+        'Conservative': ThresholdPolicy(raise_strength=0.85, raise_fraction=0.5, call_margin=0.1, rng=rng,
+                                        board_cache=board_cache),
+    }
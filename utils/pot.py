@@ -0,0 +1,94 @@
+import bisect
+
+
+class SidePots:
+    """The main pot and the side pots of a round, built up as the bets are committed.
+
+    The pots are layers of the players' contributions between consecutive all-in levels:
+    layer i holds the chips between levels[i - 1] (or zero) and levels[i], the last layer holds
+    the chips above the highest all-in level. A seat may win a layer if it hasn't folded and has
+    contributed up to the top of the layer (above its bottom for the last layer).
+
+    Attributes
+    ----------
+    contributions : list[int]
+        Total amount every seat has put into the bank during the round.
+    levels : list[int]
+        Sorted distinct contributions of the all-in seats.
+    amounts : list[int]
+        Amount of chips in every layer, one more than there are levels.
+    """
+
+    def __init__(self, n_seats: int):
+        self.contributions = [0] * n_seats
+        self.levels = []
+        self.amounts = [0]
+
+    @property
+    def total(self) -> int:
+        return sum(self.amounts)
+
+    def commit(self, seat: int, amount: int):
+        """Spread the chips of a bet over the layers they cover."""
+        start = self.contributions[seat]
+        end = start + amount
+        self.contributions[seat] = end
+        layer = bisect.bisect_right(self.levels, start)
+        while start < end:
+            top = self.levels[layer] if layer < len(self.levels) else end
+            chips = min(end, top) - start
+            self.amounts[layer] += chips
+            start += chips
+            layer += 1
+
+    def add_all_in(self, seat: int):
+        """Open a new level at the contribution of a seat which has just gone all-in
+        by splitting the layer the level falls into.
+        """
+        level = self.contributions[seat]
+        layer = bisect.bisect_left(self.levels, level)
+        if level == 0 or (layer < len(self.levels) and self.levels[layer] == level):
+            return
+        bottom = self.levels[layer - 1] if layer else 0
+        lower_amount = sum(min(c, level) - min(c, bottom) for c in self.contributions)
+        self.levels.insert(layer, level)
+        self.amounts[layer] -= lower_amount
+        self.amounts.insert(layer, lower_amount)
+
+    def award(self, hand_values: list[int], live: list[bool], turn_order: list[int]) -> list[int]:
+        """How much every seat wins at the showdown.
+
+        Layers are resolved from the top down while the seats are added to the contenders in the order
+        of decreasing contribution, so that the hands are ranked in a single pass. Every layer is split
+        between the best contenders, the remainder goes to the first of them in the turn order. Chips of
+        a layer which nobody still in the round can win go to the winners of the layer below.
+        """
+        payouts = [0] * len(self.contributions)
+        position = {seat: i for i, seat in enumerate(turn_order)}
+        contenders = sorted((seat for seat, is_live in enumerate(live) if is_live),
+                            key=self.contributions.__getitem__, reverse=True)
+        best_value, best_seats = None, []
+        carry, next_contender = 0, 0
+        for layer in range(len(self.amounts) - 1, -1, -1):
+            while next_contender < len(contenders):
+                seat = contenders[next_contender]
+                contribution = self.contributions[seat]
+                if layer < len(self.levels) and contribution < self.levels[layer]:
+                    break
+                if layer == len(self.levels) and contribution <= (self.levels[-1] if self.levels else 0):
+                    break
+                if best_value is None or hand_values[seat] > best_value:
+                    best_value, best_seats = hand_values[seat], [seat]
+                elif hand_values[seat] == best_value:
+                    best_seats.append(seat)
+                next_contender += 1
+            amount = self.amounts[layer] + carry
+            if not best_seats:
+                carry = amount
+                continue
+            carry = 0
+            share, remainder = divmod(amount, len(best_seats))
+            for seat in best_seats:
+                payouts[seat] += share
+            payouts[min(best_seats, key=position.__getitem__)] += remainder
+        return payouts
@@ -0,0 +1,101 @@
+import argparse
+import pathlib
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from utils.cards import RANKS
+from utils.equity import Cards, EquityResult, monte_carlo_equity, to_card_ints
+
+
+PREFLOP_TABLE_PATH = pathlib.Path(__file__).parent.parent / 'assets' / 'preflop_equity.npy'
+N_RANKS = len(RANKS)
+N_HAND_CLASSES = N_RANKS * N_RANKS
+MAX_OPPONENTS = 13
+TABLE_FIELDS = ('win', 'tie', 'equity', 'half_width')
+
+
+def hand_class(hole_cards: Cards) -> int:
+    """Index of the canonical starting hand in the range 0-168.
+    Suited hands have the higher rank first, offsuit ones the lower rank first, pairs have both equal.
+    """
+    first, second = to_card_ints(hole_cards)
+    high, low = max(first >> 2, second >> 2), min(first >> 2, second >> 2)
+    if first & 3 == second & 3:
+        return high * N_RANKS + low
+    return low * N_RANKS + high
+
+
+def hand_classes(hole_cards: np.ndarray) -> np.ndarray:
+    """Vectorized hand_class of integer-encoded hole cards of shape (n, 2)."""
+    ranks, suits = hole_cards >> 2, hole_cards & 3
+    high, low = ranks.max(axis=1), ranks.min(axis=1)
+    return np.where(suits[:, 0] == suits[:, 1], high * N_RANKS + low, low * N_RANKS + high)
+
+
+def class_representative(class_idx: int) -> list[int]:
+    """Two integer-encoded cards belonging to a canonical starting hand."""
+    first_rank, second_rank = divmod(class_idx, N_RANKS)
+    if first_rank > second_rank:  # suited
+        return [first_rank << 2, second_rank << 2]
+    return [first_rank << 2, second_rank << 2 | 1]
+
+
+def hand_class_name(class_idx: int) -> str:
+    """Conventional name of a starting hand such as 'AKs', 'T9o' or '77'."""
+    symbols = '23456789TJQKA'
+    first_rank, second_rank = divmod(class_idx, N_RANKS)
+    high, low = symbols[max(first_rank, second_rank)], symbols[min(first_rank, second_rank)]
+    if first_rank == second_rank:
+        return high + low
+    return high + low + ('s' if first_rank > second_rank else 'o')
+
+
+def build_preflop_table(path: pathlib.Path = PREFLOP_TABLE_PATH, n_samples: int = 50_000,
+                        tolerance: Optional[float] = 0.01, n_workers: int = 1, seed: int = 0):
+    """Estimate the equity of every starting hand against 1 to MAX_OPPONENTS opponents
+    and write it into a .npy file of shape (N_HAND_CLASSES, MAX_OPPONENTS, len(TABLE_FIELDS)).
+    The file is memory-mapped on load, so reading it needs neither parsing nor copying.
+    """
+    table = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                      shape=(N_HAND_CLASSES, MAX_OPPONENTS, len(TABLE_FIELDS)))
+    for class_idx in range(N_HAND_CLASSES):
+        for n_opponents in range(1, MAX_OPPONENTS + 1):
+            result = monte_carlo_equity(class_representative(class_idx), n_opponents=n_opponents,
+                                        n_samples=n_samples, tolerance=tolerance, n_workers=n_workers,
+                                        seed=seed + class_idx * MAX_OPPONENTS + n_opponents)
+            table[class_idx, n_opponents - 1] = (result.win, result.tie, result.equity,
+                                                 result.interval_width / 2)
+        print(hand_class_name(class_idx), ' '.join(f'{equity:.3f}' for equity in table[class_idx, :, 2]))
+    table.flush()
+    load_preflop_table.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def load_preflop_table(path: pathlib.Path = PREFLOP_TABLE_PATH) -> Optional[np.ndarray]:
+    """Memory-map the preflop table, None if it hasn't been built."""
+    if not path.exists():
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def preflop_equity(hole_cards: Cards, n_opponents: int) -> Optional[EquityResult]:
+    """Read the equity of hole cards against n_opponents from the preflop table, None if there is no table."""
+    table = load_preflop_table()
+    if table is None:
+        return None
+    win, tie, equity, half_width = table[hand_class(hole_cards), n_opponents - 1].tolist()
+    return EquityResult(win=win, tie=tie, loss=1 - win - tie, equity=equity, n_samples=0,
+                        confidence_interval=(equity - half_width, equity + half_width))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the preflop equity table.')
+    parser.add_argument('--output', type=pathlib.Path, default=PREFLOP_TABLE_PATH)
+    parser.add_argument('--samples', type=int, default=50_000, help='maximum number of runouts per entry')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='confidence interval width to stop at')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    build_preflop_table(args.output, args.samples, args.tolerance, args.workers, args.seed)
@@ -0,0 +1,127 @@
+import bisect
+import pickle
+from collections import deque
+from typing import Optional, Sequence
+
+import numpy as np
+
+from utils.game import Game, GameCheckpoint, Round
+from utils.history import Event, HandHistoryWriter, hand_bounds
+from utils.player import Player
+
+
+DEFAULT_CHECKPOINT_EVERY = 1_000
+ACTION_EVENTS = (Event.FOLD, Event.CHECK, Event.CALL, Event.RAISE)
+
+
+class ScriptedActions:
+    """Policy which repeats the logged actions of a hand in their order, whoever is asked."""
+
+    def __init__(self, hand_records: np.ndarray):
+        actions = hand_records[np.isin(hand_records['event'], ACTION_EVENTS)]
+        self.bets = deque(-1 if event == Event.FOLD else amount
+                          for event, amount in zip(actions['event'].tolist(), actions['amount'].tolist()))
+
+    def __call__(self, player, community_cards, n_opponents, to_call, pot):
+        if not self.bets:
+            raise ValueError('The round goes on after the last logged action, the log does not match the replay.')
+        return self.bets.popleft()
+
+
+def hand_records(records: np.ndarray, hand: int, bounds: Optional[np.ndarray] = None) -> np.ndarray:
+    """Records of the hand with the given number, `bounds` of the log can be passed to avoid a scan."""
+    bounds = hand_bounds(records) if bounds is None else bounds
+    first = int(records['hand'][0])
+    return records[bounds[hand - first]:bounds[hand - first + 1]]
+
+
+def _field(records: np.ndarray, event: Event, name: str = 'amount') -> np.ndarray:
+    return records[name][records['event'] == event]
+
+
+def _check_hole_cards(game_round: Round, records: np.ndarray):
+    logged = _field(records, Event.HOLE_CARDS, 'cards')[:, :2].tolist()
+    dealt = [[card.index for card in player.cards[:2]] for player in game_round.seats]
+    if logged != dealt:
+        raise ValueError('The dealt cards differ from the logged ones, the log does not match the replay.')
+
+
+def play_to(game_round: Round, until_action: Optional[int] = None) -> Round:
+    """Run the round to its end or until the given number of actions has been made."""
+    while not game_round.is_finished and (until_action is None or game_round.n_actions < until_action):
+        game_round.next_event()
+    return game_round
+
+
+def replay_round(records: np.ndarray, hand: int, until_action: Optional[int] = None,
+                 players: Optional[Sequence[Player]] = None) -> Round:
+    """Rebuild a logged hand from its seed and its actions without re-playing the hands before it.
+
+    With `until_action` the round stops right before the action of that number, i.e. in the state
+    the player to act saw. The players are named after their seats unless given.
+    """
+    records = hand_records(records, hand)
+    seeds = _field(records, Event.DECK_SEED)
+    if not len(seeds):
+        raise ValueError('The hand has been logged without the seed of its deck, it can not be replayed.')
+    stacks = _field(records, Event.SEAT).tolist()
+    if players is None:
+        players = [Player(f'Seat {seat}', funds=stack) for seat, stack in enumerate(stacks)]
+    script = ScriptedActions(records)
+    for player in players:
+        player.policy = script
+    small_blind, big_blind = _field(records, Event.BLIND).tolist()
+    game_round = Round(deque(players), small_blind, big_blind, seed=int(seeds[0]))
+    _check_hole_cards(game_round, records)
+    return play_to(game_round, until_action)
+
+
+def play_recorded(game: Game, n_hands: int, history: HandHistoryWriter,
+                  checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY) -> list[GameCheckpoint]:
+    """Play hands of a game logging them into the history, and save the state of the game
+    before every `checkpoint_every` hands. The log must start with the first hand of the game.
+    """
+    game.history = history
+    checkpoints = []
+    for _ in range(n_hands):
+        if game.is_over:
+            break
+        if game.rounds_played % checkpoint_every == 0:
+            checkpoints.append(game.checkpoint())
+        play_to(game.play_round())
+    return checkpoints
+
+
+def save_checkpoints(path: str, checkpoints: list[GameCheckpoint]):
+    with open(path, 'wb') as file:
+        pickle.dump(checkpoints, file)
+
+
+def load_checkpoints(path: str) -> list[GameCheckpoint]:
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def seek(records: np.ndarray, checkpoints: list[GameCheckpoint], hand: int) -> Game:
+    """The game right before the given hand: restored from the last checkpoint before it and fast-forwarded
+    through the logged hands in between, whose actions are repeated instead of asking the policies.
+    The players get the policies of the game back, statistics and the history are left for the caller to attach.
+    """
+    position = bisect.bisect_right([checkpoint.rounds_played for checkpoint in checkpoints], hand) - 1
+    if position < 0:
+        raise ValueError('There is no checkpoint before the hand.')
+    game = Game.from_checkpoint(checkpoints[position])
+    bounds = hand_bounds(records)
+    while game.rounds_played < hand:
+        if game.is_over:
+            raise ValueError('The game is over before the hand.')
+        logged = hand_records(records, game.rounds_played, bounds)
+        script = ScriptedActions(logged)
+        for player in game.players:
+            player.policy = script
+        game_round = game.play_round()
+        _check_hole_cards(game_round, logged)
+        play_to(game_round)
+    for player in game.players:
+        player.policy = game.policies.get(player.behavior)
+    return game
@@ -0,0 +1,218 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+from utils.ai import batch_lookup_tables, lookup_tables
+from utils.cards import PlayingCard
+from utils.game import Game, Round
+from utils.instrument import instrumented
+from utils.player import Player
+from utils.preflop import load_preflop_table
+
+
+DEFAULT_MAX_TABLES = 1_000
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_IDLE = 60 * 60  # seconds after which an untouched table may be closed
+
+
+def warm_up():
+    """Load the lookup tables of the engine, they are shared by all the tables of the process."""
+    lookup_tables()
+    batch_lookup_tables()
+    load_preflop_table()
+
+
+@dataclass(frozen=True)
+class PlayerView:
+    """A copy of what a client may show about a player, which the game doesn't change afterwards.
+
+    Attributes
+    ----------
+    id : int
+        Id of the player, see Player.id.
+    name, behavior : str
+        Name and behavior of the player.
+    funds : int
+        Chips of the player outside the pot.
+    cards : tuple[PlayingCard, ...]
+        Hole cards of the player.
+    folded : bool
+        Whether the player is out of the current round, having folded or not having been dealt in.
+    """
+    id: int
+    name: str
+    behavior: str
+    funds: int
+    cards: tuple[PlayingCard, ...]
+    folded: bool
+
+    @classmethod
+    def of_player(cls, player: Player, in_round: bool) -> 'PlayerView':
+        return cls(player.id, player.name, player.behavior, player.funds, tuple(player.cards), not in_round)
+
+
+@dataclass(frozen=True)
+class TableView:
+    """What a client needs to show a table, copied at one moment under the lock of the table,
+    so that it can be read from any thread while the game goes on.
+
+    Attributes
+    ----------
+    table_id : str
+        Key of the table in the service.
+    stage_idx : int
+        Stage of the current round, see Round.stage_idx.
+    active_player : PlayerView
+        Player whose turn it is.
+    next_action : str
+        What happens on the next action, see Round.determine_next_event.
+    bank : int
+        Chips in the pot.
+    community_cards : tuple[PlayingCard, ...]
+        Cards on the table.
+    players : tuple[PlayerView, ...]
+        Everybody who has sat down at the table, in the order of the game.
+    you : Optional[PlayerView]
+        The player of the client, if any.
+    winners : tuple[PlayerView, ...]
+        Winners of the round once it is over.
+    """
+    table_id: str
+    stage_idx: int
+    active_player: PlayerView
+    next_action: str
+    bank: int
+    community_cards: tuple[PlayingCard, ...]
+    players: tuple[PlayerView, ...]
+    you: Optional[PlayerView]
+    winners: tuple[PlayerView, ...]
+
+
+@dataclass
+class _Table:
+    game: Game
+    round: Round
+    you: Optional[Player]
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class GameService:
+    """Hosts many tables in one process for any number of clients, e.g. the sessions of the app.
+
+    Every table has a lock of its own, so actions at one table are serialized while different tables
+    are played concurrently, either from the threads of the clients or from the pool of the service
+    through the `*_async` methods. The engine's lookup tables and the GUI's image caches are process-wide,
+    so they are loaded once and shared by all the tables.
+
+    Attributes
+    ----------
+    max_tables : int
+        Number of open tables above which new ones are refused.
+    executor : ThreadPoolExecutor
+        Pool running the asynchronous actions.
+    """
+
+    def __init__(self, max_tables: int = DEFAULT_MAX_TABLES, max_workers: int = DEFAULT_WORKERS):
+        self.max_tables = max_tables
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='game-service')
+        self._tables: dict[str, _Table] = {}
+        self._pending = 0  # tables being created, counted against max_tables
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __contains__(self, table_id: str) -> bool:
+        return table_id in self._tables
+
+    def _table(self, table_id: str) -> _Table:
+        table = self._tables.get(table_id)
+        if table is None:
+            raise ValueError(f'There is no table {table_id!r}, it may have been closed.')
+        table.last_used = time.monotonic()
+        return table
+
+    def create_table(self, players: Sequence[Player], small_blind: int = 1, big_blind: int = 2,
+                     you: Optional[Player] = None) -> str:
+        """Seat the players at a new table, deal its first round and return the key of the table."""
+        with self._lock:  # the slot is reserved before the game is built outside the lock
+            if len(self._tables) + self._pending >= self.max_tables:
+                raise RuntimeError(f'The service already hosts {self.max_tables} tables.')
+            self._pending += 1
+        table = None
+        try:
+            game = Game(players=deque(players), small_blind=small_blind, big_blind=big_blind)
+            table = _Table(game, game.play_round(), you)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if table is not None:
+                    table_id = uuid.uuid4().hex
+                    self._tables[table_id] = table
+        return table_id
+
+    def _view(self, table_id: str, table: _Table) -> TableView:
+        game_round = table.round
+        game_round.determine_next_event()
+        in_round = set(game_round.players)
+        views = {player: PlayerView.of_player(player, player in in_round) for player in table.game.initial_players}
+        return TableView(table_id=table_id,
+                         stage_idx=game_round.stage_idx,
+                         active_player=views[game_round.players[0]],
+                         next_action=game_round.next_action,
+                         bank=game_round.bank,
+                         community_cards=tuple(game_round.community_cards),
+                         players=tuple(views.values()),
+                         you=views.get(table.you),
+                         winners=tuple(views[player] for player in game_round.winners))
+
+    def view(self, table_id: str) -> TableView:
+        table = self._table(table_id)
+        with table.lock:
+            return self._view(table_id, table)
+
+    @instrumented
+    def act(self, table_id: str) -> TableView:
+        """Perform the next event of the round of the table, see Round.next_event."""
+        table = self._table(table_id)
+        with table.lock:
+            table.round.next_event()
+            return self._view(table_id, table)
+
+    def new_round(self, table_id: str) -> TableView:
+        """Deal the next round of the game of the table."""
+        table = self._table(table_id)
+        with table.lock:
+            if table.game.is_over:
+                raise RuntimeError('The game is over, less than two players can afford the big blind.')
+            table.round = table.game.play_round()
+            return self._view(table_id, table)
+
+    def act_async(self, table_id: str) -> Future:
+        return self.executor.submit(self.act, table_id)
+
+    def new_round_async(self, table_id: str) -> Future:
+        return self.executor.submit(self.new_round, table_id)
+
+    def close_table(self, table_id: str):
+        with self._lock:
+            self._tables.pop(table_id, None)
+
+    def close_idle(self, max_idle: float = DEFAULT_MAX_IDLE) -> int:
+        """Close the tables nobody has touched for `max_idle` seconds, returns how many have been closed."""
+        deadline = time.monotonic() - max_idle
+        with self._lock:
+            idle = [table_id for table_id, table in self._tables.items() if table.last_used < deadline]
+            for table_id in idle:
+                del self._tables[table_id]
+        return len(idle)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        with self._lock:
+            self._tables.clear()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from utils.board_cache import BOARD_CACHE, attach_board_cache
+from utils.game import Game, Round
+from utils.history import HandHistoryWriter
+from utils.instrument import PROFILE_MODES, capture
+from utils.opponents import OpponentStats
+
+
+BEHAVIORS = ('Standard', 'Risky', 'Conservative')
+MAX_ACTIONS_PER_ROUND = 1_000
+
+Policy = Callable[..., int]  # (player, community_cards, n_opponents, to_call, pot) -> bet, -1 to fold
+
+
+@dataclass
+class SimulationStats:
+    """Results of simulated hands aggregated by the behavior of the players.
+
+    Attributes
+    ----------
+    hands : int
+        Number of played hands.
+    actions : int
+        Total number of player actions in all hands.
+    final_stages : Counter
+        Number of hands which ended at every stage index.
+    hands_played : Counter
+        Number of hands dealt to the players of every behavior.
+    hands_won : Counter
+        Number of hands won or split by the players of every behavior.
+    chips_won : Counter
+        Net chip flow of the players of every behavior.
+    """
+    hands: int = 0
+    actions: int = 0
+    final_stages: Counter = field(default_factory=Counter)
+    hands_played: Counter = field(default_factory=Counter)
+    hands_won: Counter = field(default_factory=Counter)
+    chips_won: Counter = field(default_factory=Counter)
+
+    def record(self, game_round: Round, funds_before: dict):
+        """Add a finished round to the statistics."""
+        self.hands += 1
+        self.actions += game_round.n_actions
+        self.final_stages[game_round.stage_idx] += 1
+        for player, funds in funds_before.items():
+            self.hands_played[player.behavior] += 1
+            self.chips_won[player.behavior] += player.funds - funds
+        for winner in game_round.winners:
+            self.hands_won[winner.behavior] += 1
+
+    def merge(self, other: 'SimulationStats'):
+        self.hands += other.hands
+        self.actions += other.actions
+        self.final_stages.update(other.final_stages)
+        self.hands_played.update(other.hands_played)
+        self.hands_won.update(other.hands_won)
+        self.chips_won.update(other.chips_won)
+
+    def summary(self) -> dict:
+        """Win rates, chips won per hand and hand lengths, ready to be dumped to JSON."""
+        behaviors = sorted(self.hands_played)
+        return {
+            'hands': self.hands,
+            'mean_actions_per_hand': self.actions / self.hands if self.hands else 0.0,
+            'final_stages': {stage: self.final_stages[stage] for stage in sorted(self.final_stages)},
+            'win_rate': {b: self.hands_won[b] / self.hands_played[b] for b in behaviors},
+            'chips_per_hand': {b: self.chips_won[b] / self.hands_played[b] for b in behaviors},
+        }
+
+
+def chunk_seed(seed: int, chunk_idx: int) -> int:
+    """Seed of a chunk of hands which depends only on the root seed and the chunk number."""
+    return int(np.random.SeedSequence(seed, spawn_key=(chunk_idx,)).generate_state(1)[0])
+
+
+def play_hands(n_hands: int, n_players: int = 6, behaviors: tuple[str, ...] = BEHAVIORS, funds: int = 200,
+               small_blind: int = 1, big_blind: int = 2, seed: int = 0,
+               policies: Optional[dict[str, Policy]] = None, history_path: Optional[str] = None,
+               compress_history: bool = False, board_cache: bool = False, profile: Optional[str] = None,
+               profile_path: Optional[str] = None) -> SimulationStats:
+    """Play n_hands complete hands without any GUI. Whenever a game is over a new one is started
+    with the initial funds. Runs inside worker processes.
+    With `history_path` every hand is appended to a hand-history log, with `board_cache` the showdowns
+    are scored through the board cache of the process. With `profile`, one of PROFILE_MODES,
+    the hands are profiled into `profile_path`.
+    """
+    rng = random.Random(seed)  # shared by the games, so a chunk is a single reproducible sequence
+    stats = SimulationStats()
+    opponent_stats = OpponentStats()  # shared by the games, so the players are profiled over all the hands
+    history = HandHistoryWriter(history_path, compress=compress_history) if history_path else None
+    game = None
+    try:
+        with capture(profile, profile_path) if profile else nullcontext():
+            while stats.hands < n_hands:
+                if game is None or game.is_over:
+                    game = Game.from_n_players(n_players, behaviors, funds, small_blind=small_blind,
+                                               big_blind=big_blind, stats=opponent_stats, history=history, rng=rng,
+                                               board_cache=BOARD_CACHE if board_cache else None)
+                    if policies is not None:  # the games play the policies of their behaviors otherwise
+                        for player in game.players:
+                            player.policy = policies.get(player.behavior)
+                funds_before = {p: p.funds for p in game.players if p.funds >= big_blind}
+                game_round = game.play_round()
+                while not game_round.is_finished:
+                    if game_round.n_actions > MAX_ACTIONS_PER_ROUND:
+                        raise RuntimeError('The round does not end, '
+                                           'check that the policies match the highest bet.')
+                    game_round.next_event()
+                stats.record(game_round, funds_before)
+    finally:
+        if history is not None:
+            history.close()
+    return stats
+
+
+def history_path(history_dir: Optional[str], chunk_idx: int) -> Optional[str]:
+    """Log of a chunk of hands, every chunk has its own so that workers never share a file."""
+    return os.path.join(history_dir, f'hands-{chunk_idx:05d}.bin') if history_dir else None
+
+
+def profile_path(profile_dir: Optional[str], chunk_idx: int, mode: Optional[str]) -> Optional[str]:
+    """Profile of a chunk of hands, pstats data for 'cprofile' and collapsed stacks for 'sample'."""
+    if not profile_dir or not mode:
+        return None
+    return os.path.join(profile_dir, f'profile-{chunk_idx:05d}.' + ('prof' if mode == 'cprofile' else 'txt'))
+
+
+def simulate(n_hands: int, n_workers: int = 1, chunk_size: int = 10_000, seed: int = 0,
+             history_dir: Optional[str] = None, shared_boards: Optional[str] = None,
+             profile: Optional[str] = None, profile_dir: Optional[str] = None, **kwargs) -> Iterator[SimulationStats]:
+    """Split n_hands into chunks played across a process pool and yield the aggregated statistics
+    every time a chunk is done. Keyword arguments are passed to `play_hands`.
+    Chunks are seeded by their number, so the final statistics don't depend on n_workers.
+    With `history_dir` every chunk writes its hands into a log of its own there.
+    `shared_boards` names a SharedBoardTable the board caches of the workers read from.
+    With `profile` every chunk is profiled into a file of its own in `profile_dir`.
+    """
+    n_chunks = -(-n_hands // chunk_size)
+    chunks = [(min(chunk_size, n_hands - i * chunk_size), chunk_seed(seed, i), history_path(history_dir, i),
+               profile_path(profile_dir, i, profile)) for i in range(n_chunks)]
+    for directory in (history_dir, profile and profile_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    totals = SimulationStats()
+    if n_workers == 1:
+        if shared_boards and BOARD_CACHE.shared is None:
+            attach_board_cache(shared_boards)
+        for size, chunk_seed_, path, profile_path_ in chunks:
+            totals.merge(play_hands(size, seed=chunk_seed_, history_path=path, profile=profile,
+                                    profile_path=profile_path_, **kwargs))
+            yield totals
+        return
+    initializer, initargs = (attach_board_cache, (shared_boards,)) if shared_boards else (None, ())
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=initializer, initargs=initargs) as executor:
+        futures = [executor.submit(play_hands, size, seed=chunk_seed_, history_path=path, profile=profile,
+                                   profile_path=profile_path_, **kwargs)
+                   for size, chunk_seed_, path, profile_path_ in chunks]
+        for future in as_completed(futures):
+            totals.merge(future.result())
+            yield totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play poker hands without the GUI and report the results '
+                                                 'as JSON lines.')
+    parser.add_argument('--hands', type=int, default=100_000)
+    parser.add_argument('--players', type=int, default=6)
+    parser.add_argument('--behaviors', default=','.join(BEHAVIORS),
+                        help='comma separated behaviors assigned to the players in turn')
+    parser.add_argument('--funds', type=int, default=200)
+    parser.add_argument('--small-blind', type=int, default=1)
+    parser.add_argument('--big-blind', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history-dir', help='directory to write binary hand-history logs into')
+    parser.add_argument('--compress-history', action='store_true')
+    parser.add_argument('--board-cache', action='store_true', help='score the showdowns through a board cache')
+    parser.add_argument('--shared-boards', help='name of a shared board table the board caches read from')
+    parser.add_argument('--profile', choices=PROFILE_MODES, help='profile every chunk of hands')
+    parser.add_argument('--profile-dir', default='profiles', help='directory to write the profiles into')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for stats in simulate(args.hands, n_workers=args.workers, chunk_size=args.chunk_size, seed=args.seed,
+                          n_players=args.players, behaviors=tuple(args.behaviors.split(',')), funds=args.funds,
+                          small_blind=args.small_blind, big_blind=args.big_blind,
+                          history_dir=args.history_dir, compress_history=args.compress_history,
+                          board_cache=args.board_cache, shared_boards=args.shared_boards,
+                          profile=args.profile, profile_dir=args.profile_dir):
+        elapsed = time.perf_counter() - start
+        print(json.dumps({**stats.summary(), 'elapsed': elapsed, 'hands_per_second': stats.hands / elapsed}),
+              flush=True)
@@ -0,0 +1,116 @@
+import numpy as np
+
+from utils.pot import SidePots
+
+
+class TableState:
+    """State of the seats at a table during a round, kept as arrays indexed by seat.
+    Actions only update entries of the arrays and the pointer to the active seat.
+
+    Attributes
+    ----------
+    n_seats : int
+        Number of seats, i.e. of players dealt into the round.
+    button : int
+        Seat from which every stage starts: the small blind before the flop, the first to act after it.
+    active : int
+        Seat whose turn it is, -1 if nobody can act anymore.
+    stacks : np.ndarray
+        Funds of every seat.
+    bets : np.ndarray
+        Amount every seat has put into the bank during the current stage.
+    acted : np.ndarray
+        Whether every seat has acted during the current stage.
+    folded : np.ndarray
+        Mask of the seats which have folded.
+    all_in : np.ndarray
+        Mask of the seats which have no funds left to bet.
+    can_act : np.ndarray
+        Mask of the seats which still make decisions, neither folded nor all-in.
+    hand_values : np.ndarray
+        Current value of the best hand of every seat.
+    pot : int
+        Total amount in the bank.
+    pots : SidePots
+        The bank split into the main pot and the side pots.
+    max_bet : int
+        Highest bet of the current stage.
+    n_live : int
+        Number of seats which haven't folded.
+    """
+
+    def __init__(self, stacks, button=0):
+        self.n_seats = len(stacks)
+        self.button = button
+        self.active = button
+        self.stacks = np.array(stacks, dtype=np.int64)
+        self.bets = np.zeros(self.n_seats, dtype=np.int64)
+        self.acted = np.zeros(self.n_seats, dtype=bool)
+        self.folded = np.zeros(self.n_seats, dtype=bool)
+        self.all_in = self.stacks <= 0
+        self.can_act = ~self.all_in
+        self.hand_values = np.zeros(self.n_seats, dtype=np.int64)
+        self.pot = 0
+        self.pots = SidePots(self.n_seats)
+        self.max_bet = 0
+        self.n_live = self.n_seats
+        # every row is the order of the turn starting from a seat
+        self._turn_orders = (np.arange(self.n_seats)[:, None] + np.arange(self.n_seats)) % self.n_seats
+
+    @property
+    def live(self) -> np.ndarray:
+        """Mask of the seats still in the round."""
+        return ~self.folded
+
+    def next_seat(self, seat: int) -> int:
+        """The first seat after the given one which can act, -1 if there is none."""
+        following = self._turn_orders[seat, 1:]
+        candidates = following[self.can_act[following]]
+        return int(candidates[0]) if len(candidates) else -1
+
+    def seats_from(self, seat: int) -> list[int]:
+        """Live seats in the order of the turn starting from the given one."""
+        order = self._turn_orders[seat]
+        return order[~self.folded[order]].tolist()
+
+    def to_call(self, seat: int) -> int:
+        """How much the seat has to add to match the highest bet of the stage."""
+        return self.max_bet - int(self.bets[seat])
+
+    def bet(self, amount: int) -> int:
+        """The active seat puts an amount into the bank and the turn passes on.
+        The bet is capped at the funds of the seat, the actual bet is returned.
+        """
+        seat = self.active
+        amount = min(amount, int(self.stacks[seat]))
+        self.pots.commit(seat, amount)
+        self.stacks[seat] -= amount
+        self.bets[seat] += amount
+        self.pot += amount
+        self.max_bet = max(self.max_bet, int(self.bets[seat]))
+        self.acted[seat] = True
+        if self.stacks[seat] <= 0:
+            self.all_in[seat] = True
+            self.can_act[seat] = False
+            self.pots.add_all_in(seat)
+        self.active = self.next_seat(seat)
+        return amount
+
+    def fold(self):
+        """The active seat leaves the round and the turn passes on."""
+        seat = self.active
+        self.folded[seat] = True
+        self.can_act[seat] = False
+        self.n_live -= 1
+        self.active = self.next_seat(seat)
+
+    def stage_over(self) -> bool:
+        """Whether every seat which can act has acted and matched the highest bet."""
+        return not (self.can_act & (~self.acted | (self.bets != self.max_bet))).any()
+
+    def start_stage(self):
+        """Reset the bets and give the turn to the first seat from the button which can act."""
+        self.bets[:] = 0
+        self.acted[:] = False
+        self.max_bet = 0
+        self.active = self.button if self.can_act[self.button] else self.next_seat(self.button)